@@ -0,0 +1,569 @@
+import json
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:  # 未安裝 lxml 時改用單次掃描的文字擷取
+    lxml = None
+
+# 不屬於頁面文字的標籤（BeautifulSoup 的 get_text 也會略過）
+_SKIP_TAGS = ('script', 'style', 'template', 'noscript')
+
+# 頁面內嵌的應用程式狀態：Next.js 的 __NEXT_DATA__ 或 type="application/json" 的 script
+_JSON_SCRIPT_RE = re.compile(
+    r'<script\b[^>]*(?:id=["\']__NEXT_DATA__["\']|type=["\']application/(?:ld\+)?json["\'])[^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL,
+)
+# 以全域變數注入的狀態，例如 window.__INITIAL_STATE__ = {...};
+_STATE_ASSIGN_RE = re.compile(r'window\.__(?:INITIAL_STATE|PRELOADED_STATE|APOLLO_STATE|NUXT)__\s*=\s*')
+
+# 清理金額時要移除的字元（數字、小數點、負號以外）
+_NON_NUMERIC_RE = re.compile(r'[^\d\-\.]')
+
+# 倉位文字：幣種代碼緊接在 Size: 前面（例如 LDOSize: 62.0、AI16ZSize: 3265.3），也可能沒有幣種代碼。
+# 以 Size: 開頭讓正則引擎能直接跳到關鍵字，幣種代碼再從前面最多 10 個字元中取得
+_POSITION_RE = re.compile(
+    r'Size:\s*(?P<size>[\d\.]+)\s*Side:\s*(?P<side>SHORT|LONG)'
+    r'\s*Realized PnL:\s*(?P<realized_pnl>[$\-\d,\.]+)\s*Unrealized PnL:\s*(?P<unrealized_pnl>[$\-\d,\.]+)'
+)
+# 幣種代碼必須以字母開頭，避免把前一個金額的數字一起吃進來（$1.23ETHSize -> ETH）
+_SYMBOL_BEFORE_RE = re.compile(r'[A-Z][A-Z0-9]{1,9}$')
+_MAX_SYMBOL_LENGTH = 10
+# 分段解析時判斷是否已取得抵押金額與頁面標示的倉位數
+_COLLATERAL_FOUND_RE = re.compile(r'Collateral Amount:[^\n$]{0,40}\$\s*-?[\d,\.]+\D')
+_OPEN_POSITIONS_RE = re.compile(r'Open Positions:\s*(\d+)\D')
+# 分段掃描時保留的重疊文字長度，以及判斷倉位區塊已結束的距離（字元數）
+_SCAN_OVERLAP = 256
+_POSITION_SECTION_GAP = 4096
+# 頁面文字沒有幣種代碼時使用的預設值
+_DEFAULT_POSITION_SYMBOL = 'AI16Z'
+
+
+class Position(NamedTuple):
+    """一筆倉位（金額為原始文字，填入結果時才清理）"""
+    symbol: str
+    size: str
+    side: str
+    realized_pnl: str
+    unrealized_pnl: str
+
+
+def clean_monetary_value(value):
+    """強力清理金額值，移除$、全形$、非數字、只留數字/小數/負號"""
+    if not value:
+        return value
+    value_str = str(value)
+    value_str = value_str.replace('$', '').replace('＄', '').strip()
+    cleaned = _NON_NUMERIC_RE.sub('', value_str)
+    if cleaned.count('.') > 1:
+        parts = cleaned.split('.')
+        cleaned = parts[0] + '.' + ''.join(parts[1:])
+    return cleaned
+
+
+def new_account_result() -> Dict[str, str]:
+    """爬取結果的欄位範本"""
+    return {
+        'address': '',
+        'collateral_amount': '',
+        'open_positions': '',
+        'balance': '',
+        'last_activity': '',
+        'last_updated': datetime.now().strftime('%Y/%m/%d %H:%M:%S'),
+        # 第一組倉位
+        'symbol1': '',
+        'size1': '',
+        'direction1': '',
+        'realized_pnl1': '',
+        'unrealized_pnl1': '',
+        'price1': '',
+        # 第二組倉位
+        'symbol2': '',
+        'size2': '',
+        'direction2': '',
+        'realized_pnl2': '',
+        'unrealized_pnl2': '',
+        'price2': '',
+        # 保持向後相容的欄位
+        'symbol': '',
+        'size': '',
+        'direction': '',
+        'realized_pnl': '',
+        'unrealized_pnl': '',
+        'current_price': ''  # 保留原有價格欄位
+    }
+
+
+class _TextSink:
+    """收集文字節點與內嵌狀態的共用邏輯，標準函式庫與 lxml 的分段解析器都使用
+
+    同一個文字節點可能分成多次 data 呼叫，遇到下一個標籤時才合併成一個字串。
+    capture_state=True 時另外解析 script 中內嵌的狀態 JSON，放入 states。
+    """
+
+    def __init__(self, capture_state: bool = False):
+        self.strings: List[str] = []
+        self.states: List[object] = []
+        self.capture_state = capture_state
+        self._skip_depth = 0
+        self._pending: List[str] = []
+        self._script_parts: Optional[List[str]] = None
+        self._script_is_json = False
+
+    def flush(self):
+        if self._pending:
+            text = ''.join(self._pending)
+            self._pending = []
+            if text:
+                self.strings.append(text)
+
+    def start(self, tag, attrs):
+        self.flush()
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        if tag == 'script' and self.capture_state:
+            self._script_parts = []
+            self._script_is_json = (attrs.get('id') == '__NEXT_DATA__'
+                                    or (attrs.get('type') or '').lower() in ('application/json', 'application/ld+json'))
+
+    def end(self, tag):
+        self.flush()
+        if tag in _SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        if tag == 'script' and self._script_parts is not None:
+            text = ''.join(self._script_parts)
+            self._script_parts = None
+            if self._script_is_json:
+                try:
+                    self.states.append(json.loads(text))
+                except ValueError:
+                    pass
+            else:
+                self.states.extend(_decode_state_assignments(text))
+
+    def data(self, data):
+        if self._script_parts is not None:
+            self._script_parts.append(data)
+        elif not self._skip_depth and data:
+            self._pending.append(data)
+
+    def close(self):
+        self.flush()
+
+
+class _TextCollector(HTMLParser):
+    """單次掃描 HTML，依序收集所有文字節點（略過 script/style），可以分段 feed"""
+
+    def __init__(self, capture_state: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.sink = _TextSink(capture_state)
+        self.strings = self.sink.strings
+        self.states = self.sink.states
+
+    def handle_starttag(self, tag, attrs):
+        self.sink.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.sink.end(tag)
+
+    def handle_data(self, data):
+        self.sink.data(data)
+
+    def close(self):
+        super().close()
+        self.sink.close()
+
+
+class _LxmlFeedCollector:
+    """以 lxml 的分段解析器（target 介面）收集文字節點，比標準函式庫的 HTMLParser 快"""
+
+    def __init__(self, capture_state: bool = False):
+        self.sink = _TextSink(capture_state)
+        self.strings = self.sink.strings
+        self.states = self.sink.states
+        self._parser = lxml.etree.HTMLParser(target=self.sink)
+
+    def feed(self, data: str):
+        self._parser.feed(data)
+
+    def close(self):
+        try:
+            self._parser.close()
+        except lxml.etree.LxmlError:
+            # 空白或截斷的頁面，已收集的內容仍可使用
+            self.sink.flush()
+
+
+def _strings_with_lxml(html: str) -> List[str]:
+    root = lxml.html.fromstring(html)
+    # drop_tree 會保留標籤後面的文字（tail），只移除標籤本身與內容
+    for element in list(root.iter(lxml.etree.Comment, *_SKIP_TAGS)):
+        element.drop_tree()
+    return [text for text in root.itertext() if text]
+
+
+def _strings_with_text_parser(html: str) -> List[str]:
+    collector = _TextCollector()
+    collector.feed(html)
+    collector.close()
+    return collector.strings
+
+
+def _strings_with_bs4(html: str) -> List[str]:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    return [str(text) for text in soup.strings]
+
+
+class PageText:
+    """一個頁面擷取一次的文字：各文字節點與合併後的全文，供所有欄位解析共用"""
+
+    def __init__(self, strings: List[str]):
+        self.strings = strings
+        self.text = ''.join(strings)
+
+    @classmethod
+    def from_html(cls, html: str, parser: str = 'lxml') -> 'PageText':
+        """parser 可為 'lxml'、'text'（標準函式庫單次掃描）或 'bs4'（原本的 BeautifulSoup）"""
+        if parser == 'lxml' and lxml is not None:
+            try:
+                return cls(_strings_with_lxml(html))
+            except Exception:
+                # 空白或格式過於破碎的頁面 lxml 會拋出例外，改用單次掃描
+                pass
+        if parser == 'bs4':
+            return cls(_strings_with_bs4(html))
+        return cls(_strings_with_text_parser(html))
+
+
+def _find_address(page: PageText) -> str:
+    # 尋找地址（通常是以0x開頭的長字串）
+    for text in page.strings:
+        if len(text) > 20 and text.startswith('0x'):
+            return text.strip()
+    return ''
+
+
+def _find_balance(page: PageText) -> str:
+    # 第一個含$符號的數字是餘額（之後的變化金額在帳戶 JSON 中沒有對應欄位，兩種解析方式都不擷取）
+    for text in page.strings:
+        if '$' in text and any(char.isdigit() for char in text):
+            return clean_monetary_value(text.strip())
+    return ''
+
+
+def _find_collateral(page: PageText) -> str:
+    # 從所有文字中尋找包含"Collateral Amount:"的行
+    start = 0
+    while True:
+        index = page.text.find('Collateral Amount:', start)
+        if index == -1:
+            return ''
+        line_start = page.text.rfind('\n', 0, index) + 1
+        line_end = page.text.find('\n', index)
+        line = page.text[line_start:line_end if line_end != -1 else len(page.text)]
+        start = index + 1
+        if '$' not in line:
+            continue
+        # 提取金額：從標籤之後找第一個$，取到下一個空格或行尾
+        # （頁面文字常被壓成一行，從行首找會取到前面的餘額）
+        dollar_index = line.find('$', index - line_start)
+        if dollar_index == -1:
+            dollar_index = line.find('$')
+        end_index = line.find(' ', dollar_index)
+        if end_index == -1:
+            end_index = len(line)
+        collateral_amount = line[dollar_index:end_index].strip()
+        # 清理可能的額外文字
+        if 'Open' in collateral_amount:
+            collateral_amount = collateral_amount.replace('Open', '').strip()
+        return clean_monetary_value(collateral_amount)
+
+
+def iter_positions(text: str) -> Iterator[Position]:
+    """單次掃描頁面文字，依序產生倉位；沒有幣種代碼的倉位使用預設幣種"""
+    previous_end = 0
+    for match in _POSITION_RE.finditer(text):
+        start = match.start()
+        symbol = _SYMBOL_BEFORE_RE.search(text, max(previous_end, start - _MAX_SYMBOL_LENGTH), start)
+        previous_end = match.end()
+        yield Position(
+            symbol.group() if symbol else _DEFAULT_POSITION_SYMBOL,
+            match.group('size'),
+            match.group('side'),
+            match.group('realized_pnl'),
+            match.group('unrealized_pnl'),
+        )
+
+
+def find_positions(text: str, limit: Optional[int] = None) -> List[Position]:
+    """取得頁面文字中的倉位，limit 為最多取得的筆數"""
+    positions = []
+    for position in iter_positions(text):
+        positions.append(position)
+        if limit is not None and len(positions) >= limit:
+            break
+    print(f"找到 {len(positions)} 個倉位匹配")
+    return positions
+
+
+def apply_positions(result: Dict[str, str], positions: List[Position]):
+    """將倉位填入第一、二組倉位欄位"""
+    open_positions = []
+    position_count = 0
+    for symbol, size, side, realized_pnl, unrealized_pnl in positions[:2]:  # 只處理前兩個倉位
+        position_count += 1
+
+        # 清理PnL值
+        realized_pnl_clean = clean_monetary_value(realized_pnl)
+        unrealized_pnl_clean = clean_monetary_value(unrealized_pnl)
+
+        # 去掉s前綴用於顯示
+        clean_symbol = symbol.replace('s', '') if symbol.startswith('s') else symbol
+
+        # 組合倉位資訊
+        position_info = f"{clean_symbol} | Size: {size} | Side: {side}"
+        if realized_pnl_clean:
+            position_info += f" | Realized PnL: {realized_pnl_clean}"
+        if unrealized_pnl_clean:
+            position_info += f" | Unrealized PnL: {unrealized_pnl_clean}"
+        open_positions.append(position_info)
+
+        # 設定對應組別的詳細資訊
+        group = str(position_count)
+        result['symbol' + group] = clean_symbol
+        result['size' + group] = size
+        result['direction' + group] = side
+        result['realized_pnl' + group] = realized_pnl_clean
+        result['unrealized_pnl' + group] = unrealized_pnl_clean
+
+        # 設定第一個倉位為主要倉位（保持向後相容）
+        if position_count == 1 and not result['symbol']:
+            result['symbol'] = clean_symbol
+            result['size'] = size
+            result['direction'] = side
+            result['realized_pnl'] = realized_pnl_clean
+            result['unrealized_pnl'] = unrealized_pnl_clean
+
+    # 組合倉位資訊 - 分別填入 Open Positions1 和 Open Positions2
+    if len(open_positions) >= 1:
+        result['open_positions'] = open_positions[0]
+    if len(open_positions) >= 2:
+        result['open_positions2'] = open_positions[1]
+
+
+def extract_embedded_state(html: str) -> List[object]:
+    """找出頁面內嵌的狀態 JSON，回傳所有能解析的物件（找不到時為空列表）"""
+    states = []
+    for match in _JSON_SCRIPT_RE.finditer(html):
+        try:
+            states.append(json.loads(match.group(1)))
+        except ValueError:
+            continue
+    states.extend(_decode_state_assignments(html))
+    return states
+
+
+def _decode_state_assignments(text: str) -> List[object]:
+    """解析 window.__INITIAL_STATE__ = {...} 這類全域變數中的 JSON"""
+    states = []
+    decoder = json.JSONDecoder()
+    for match in _STATE_ASSIGN_RE.finditer(text):
+        try:
+            states.append(decoder.raw_decode(text, match.end())[0])
+        except ValueError:
+            continue
+    return states
+
+
+def _is_account(value) -> bool:
+    return isinstance(value, dict) and isinstance(value.get('positions'), list) and 'collateral' in value
+
+
+def find_account(state, max_depth: int = 12) -> Optional[Dict]:
+    """在狀態中尋找帳戶物件（同時包含 collateral 與 positions 的 dict）"""
+    stack = [(state, 0)]
+    while stack:
+        value, depth = stack.pop()
+        if _is_account(value):
+            return value
+        if depth >= max_depth:
+            continue
+        if isinstance(value, dict):
+            children = value.values()
+        elif isinstance(value, list):
+            children = value
+        else:
+            continue
+        # 反向放入堆疊，讓搜尋順序與文件順序一致
+        stack.extend((child, depth + 1) for child in reversed(list(children)) if isinstance(child, (dict, list)))
+    return None
+
+
+def _json_number(value) -> str:
+    """JSON 中的數字或數字字串轉成欄位文字"""
+    if value is None or value == '':
+        return ''
+    return clean_monetary_value(str(value))
+
+
+def result_from_account_json(account: Dict) -> Dict[str, str]:
+    """將 Lighter 帳戶 JSON（網頁內嵌狀態或 API 回應）轉成與網頁爬取相同的結果格式"""
+    result = new_account_result()
+    result['address'] = str(account.get('l1_address') or account.get('address') or '')
+    result['collateral_amount'] = _json_number(account.get('collateral'))
+    result['balance'] = _json_number(account.get('total_asset_value', account.get('collateral')))
+
+    positions = []
+    for position in account.get('positions') or []:
+        if not isinstance(position, dict):
+            continue
+        size = _json_number(position.get('position'))
+        # 已平倉的市場仍會出現在列表中，數量為 0
+        try:
+            if not size or float(size) == 0:
+                continue
+        except ValueError:
+            continue
+        size = size.lstrip('-')
+        side = 'SHORT' if str(position.get('sign')) == '-1' or str(position.get('position', '')).startswith('-') else 'LONG'
+        positions.append(Position(
+            str(position.get('symbol') or '').upper(),
+            size,
+            side,
+            _json_number(position.get('realized_pnl')),
+            _json_number(position.get('unrealized_pnl')),
+        ))
+    print(f"從 JSON 找到 {len(positions)} 個倉位")
+    apply_positions(result, positions)
+    return result
+
+
+def parse_embedded_account(html: str) -> Optional[Dict[str, str]]:
+    """從頁面內嵌的狀態 JSON 取得帳戶資料，找不到帳戶時回傳 None"""
+    for state in extract_embedded_state(html):
+        account = find_account(state)
+        if account is not None:
+            return result_from_account_json(account)
+    return None
+
+
+def parse_account_page(html: str, parser: str = 'lxml') -> Dict[str, str]:
+    """解析 Lighter 帳戶頁面：優先使用內嵌的狀態 JSON，沒有時才從頁面文字比對
+
+    文字只擷取一次，地址、金額、抵押與倉位都使用同一份結果。
+    """
+    embedded = parse_embedded_account(html)
+    if embedded is not None:
+        return embedded
+
+    return _result_from_page(PageText.from_html(html, parser))
+
+
+def _result_from_page(page: PageText) -> Dict[str, str]:
+    result = new_account_result()
+    result['address'] = _find_address(page)
+    result['balance'] = _find_balance(page)
+    result['collateral_amount'] = _find_collateral(page)
+    apply_positions(result, find_positions(page.text, limit=2))
+    return result
+
+
+class IncrementalAccountParser:
+    """邊下載邊解析帳戶頁面：分段 feed HTML，已取得所需欄位時 feed 回傳 True，可提早停止下載
+
+    所需欄位為抵押金額加上前 required_positions 個倉位（頁面標示的 Open Positions 較少時以該數量為準），
+    或頁面內嵌的帳戶狀態 JSON。頁面沒有標示倉位數時，倉位區塊結束（抵押或最後一個倉位之後
+    section_gap 個字元內沒有新的倉位）也視為完成；有標示時一定要讀到該數量（最多 required_positions 個）。
+    每段只掃描新增的文字，加上一小段重疊避免比對被分段切斷。
+    """
+
+    def __init__(self, parser: str = 'lxml', required_positions: int = 2, section_gap: int = _POSITION_SECTION_GAP):
+        self.required_positions = required_positions
+        self.section_gap = section_gap
+        self.complete = False
+        if parser == 'lxml' and lxml is not None:
+            self._collector = _LxmlFeedCollector(capture_state=True)
+        else:
+            self._collector = _TextCollector(capture_state=True)
+        self._account: Optional[Dict] = None
+        self._checked_strings = 0
+        self._checked_states = 0
+        self._tail = ''          # 尚未確定的文字（上次掃描後保留的重疊部分加上新文字）
+        self._tail_start = 0     # _tail 在全文中的位置
+        self._collateral_end: Optional[int] = None
+        self._expected_positions: Optional[int] = None
+        self._positions_found = 0
+        self._last_position_end: Optional[int] = None
+
+    def feed(self, chunk: str) -> bool:
+        """加入一段 HTML，回傳是否已取得所有需要的欄位"""
+        if not self.complete:
+            self._collector.feed(chunk)
+            self.complete = self._check_complete()
+        return self.complete
+
+    def _check_complete(self) -> bool:
+        states = self._collector.states
+        for state in states[self._checked_states:]:
+            self._account = find_account(state)
+            if self._account is not None:
+                return True
+        self._checked_states = len(states)
+
+        strings = self._collector.strings
+        if len(strings) == self._checked_strings:
+            return False
+        tail = self._tail + ''.join(strings[self._checked_strings:])
+        self._checked_strings = len(strings)
+
+        if self._collateral_end is None:
+            match = _COLLATERAL_FOUND_RE.search(tail)
+            if match:
+                self._collateral_end = self._tail_start + match.end()
+        if self._expected_positions is None:
+            match = _OPEN_POSITIONS_RE.search(tail)
+            if match:
+                self._expected_positions = int(match.group(1))
+
+        # 只計算後面還有文字的倉位，避免最後一筆的金額被分段切斷
+        keep_from = max(0, len(tail) - _SCAN_OVERLAP)
+        for match in _POSITION_RE.finditer(tail):
+            if match.end() >= len(tail):
+                keep_from = min(keep_from, match.start())
+                break
+            self._positions_found += 1
+            self._last_position_end = self._tail_start + match.end()
+            keep_from = max(keep_from, match.end())
+        text_end = self._tail_start + len(tail)
+        self._tail = tail[keep_from:]
+        self._tail_start += keep_from
+
+        if self._collateral_end is None:
+            return False
+        required = self.required_positions
+        if self._expected_positions is not None:
+            required = min(required, self._expected_positions)
+        if self._positions_found >= required:
+            return True
+        # 頁面標示的倉位還沒讀完時不能提前結束，倉位前面可能有很長的其他區塊
+        if self._expected_positions is not None:
+            return False
+        # 倉位區塊已結束：之後很長一段文字都沒有新的倉位
+        last_hit = max(self._collateral_end, self._last_position_end or 0)
+        return text_end - last_hit >= self.section_gap and 'Size:' not in self._tail
+
+    def result(self) -> Dict[str, str]:
+        """依目前已解析的內容產生結果（內嵌狀態優先）"""
+        if self.complete:
+            self._collector.sink.flush()
+        else:
+            self._collector.close()
+            self._check_complete()
+        if self._account is not None:
+            return result_from_account_json(self._account)
+        return _result_from_page(PageText(self._collector.strings))
@@ -0,0 +1,154 @@
+import re
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+from account_parser import result_from_account_json
+from http_client import PooledHttpSession
+
+# 區塊瀏覽器網址中的帳戶代號：/account/53015 或 /account/0x...、/address/0x...
+_ACCOUNT_URL_RE = re.compile(r'/(?:account|address)/([a-zA-Z0-9]+)')
+
+OnResult = Optional[Callable[[Dict[str, str]], None]]
+
+
+class AccountDataSource(ABC):
+    """帳戶資料來源介面：fetch_accounts 依輸入網址順序回傳結果，失敗的網址回傳 {}
+
+    結果格式與 account_parser.new_account_result 相同。
+    """
+
+    name = 'source'
+
+    @abstractmethod
+    def fetch_accounts(self, urls: List[str], on_result: OnResult = None) -> List[Dict[str, str]]:
+        """取得多個網址的帳戶資料，on_result 在每個結果完成時立即被呼叫"""
+
+    def close(self):
+        """釋放資料來源自己建立的連線"""
+
+
+class HtmlScraperSource(AccountDataSource):
+    """下載並解析區塊瀏覽器頁面（scrape_urls 通常為 SheetsProcessor.scrape_urls）"""
+
+    name = 'html'
+
+    def __init__(self, scrape_urls: Callable[[List[str], OnResult], List[Dict[str, str]]]):
+        self.scrape_urls = scrape_urls
+
+    def fetch_accounts(self, urls: List[str], on_result: OnResult = None) -> List[Dict[str, str]]:
+        return self.scrape_urls(urls, on_result)
+
+
+class LighterApiSource(AccountDataSource):
+    """直接查詢 Lighter 帳戶 API（/api/v1/account），不下載也不解析 HTML
+
+    網址中的帳戶代號為數字時以 index 查詢；為 0x 地址時以 l1_address 查詢，
+    一次請求即可取得該地址下的所有子帳戶，同一地址的多個網址共用同一個請求。
+    base_url 可指向本地測試伺服器。
+    """
+
+    name = 'lighter_api'
+
+    def __init__(self, base_url: str = 'https://mainnet.zklighter.elliot.ai', session: Optional[PooledHttpSession] = None,
+                 max_workers: int = 4, max_retries: int = 3, retry_delay: float = 1.0):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.session = session or PooledHttpSession(headers={'Accept': 'application/json'}, timeout=10,
+                                                    pool_maxsize=self.max_workers)
+
+    @staticmethod
+    def account_key(url: str) -> Optional[Tuple[str, str]]:
+        """從網址取得 (查詢方式, 帳戶代號)，無法辨識時回傳 None"""
+        match = _ACCOUNT_URL_RE.search(str(url or ''))
+        if not match:
+            return None
+        value = match.group(1)
+        if value.isdigit():
+            return 'index', value
+        if value.lower().startswith('0x'):
+            return 'l1_address', value
+        return None
+
+    def _request_accounts(self, by: str, value: str) -> List[Dict]:
+        """查詢一個帳戶代號，回傳 API 的 accounts 列表"""
+        for retry_count in range(self.max_retries):
+            try:
+                response = self.session.get(f"{self.base_url}/api/v1/account", params={'by': by, 'value': value})
+                if response.status_code == 404:
+                    return []
+                response.raise_for_status()
+                return response.json().get('accounts') or []
+            except Exception as e:
+                print(f"查詢帳戶 API 錯誤 ({by}={value}, 嘗試 {retry_count + 1}/{self.max_retries}): {e}")
+                if retry_count < self.max_retries - 1:
+                    time.sleep(self.retry_delay * (retry_count + 1))
+        return []
+
+    @staticmethod
+    def _pick_account(key: Tuple[str, str], accounts: List[Dict]) -> Optional[Dict]:
+        by, value = key
+        if by == 'index':
+            # 找不到同一個 index 時不能用其他子帳戶的資料代替
+            for account in accounts:
+                if str(account.get('index')) == value:
+                    return account
+            if accounts:
+                print(f"帳戶 API 回應中沒有 index={value} 的帳戶")
+            return None
+        # 以地址查詢時取主帳戶（第一個有倉位或抵押的帳戶）
+        for account in accounts:
+            if account.get('positions') or account.get('collateral'):
+                return account
+        return accounts[0] if accounts else None
+
+    @staticmethod
+    def _notify(on_result: OnResult, result: Dict[str, str]):
+        if on_result:
+            try:
+                on_result(result)
+            except Exception as e:
+                print(f"處理帳戶資料時發生錯誤: {e}")
+
+    def fetch_accounts(self, urls: List[str], on_result: OnResult = None) -> List[Dict[str, str]]:
+        if not urls:
+            return []
+        start_time = time.monotonic()
+        keys = [self.account_key(url) for url in urls]
+        unique_keys = list(dict.fromkeys(key for key in keys if key is not None))
+        print(f"透過帳戶 API 查詢 {len(urls)} 個網址（{len(unique_keys)} 個請求）")
+
+        results: List[Dict[str, str]] = [{} for _ in urls]
+        rows_by_key: Dict[Tuple[str, str], List[int]] = {}
+        for row, (url, key) in enumerate(zip(urls, keys)):
+            if key is None:
+                print(f"無法從網址取得帳戶代號: {url}")
+                self._notify(on_result, {})
+            else:
+                rows_by_key.setdefault(key, []).append(row)
+
+        # 每個請求完成時立即回傳對應網址的結果，讓後續查價可以同時進行
+        workers = min(self.max_workers, max(1, len(unique_keys)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self._request_accounts, *key): key for key in unique_keys}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    account = self._pick_account(key, future.result())
+                except Exception as e:
+                    print(f"處理帳戶 API 回應時發生錯誤 ({key[0]}={key[1]}): {e}")
+                    account = None
+                result = result_from_account_json(account) if account is not None else {}
+                for row in rows_by_key[key]:
+                    results[row] = result if row == rows_by_key[key][0] else dict(result)
+                    self._notify(on_result, results[row])
+
+        print(f"帳戶 API 查詢完成: {len(urls)} 個網址，耗時 {time.monotonic() - start_time:.1f} 秒")
+        print(f"連線統計: {self.session.format_stats()}")
+        return results
+
+    def close(self):
+        self.session.close()
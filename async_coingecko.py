@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from coingecko_price_fetcher import CoinGeckoPriceFetcher
+
+
+class AsyncCoinGeckoPriceFetcher:
+    """CoinGeckoPriceFetcher 的 asyncio 版本：同時送出彼此獨立的批次、搜尋與市場資料請求
+
+    HTTP 請求仍由同步的 fetcher 透過共用連線池發送，在執行緒池中並行執行；
+    所有請求共用 fetcher 的限流器，因此並行後總速率仍維持在每分鐘配額內。
+    """
+
+    def __init__(self, fetcher: Optional[CoinGeckoPriceFetcher] = None, max_concurrency: int = 4):
+        self.fetcher = fetcher or CoinGeckoPriceFetcher()
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix='coingecko')
+
+    async def _run(self, semaphore: asyncio.Semaphore, func, *args):
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def resolve_coin_ids(self, symbols: List[str]) -> Dict[str, Optional[str]]:
+        """同時解析多個 symbol 的 CoinGecko ID"""
+        symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol and symbol.strip()))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        coin_ids = await asyncio.gather(*(self._run(semaphore, self.fetcher._resolve_coin_id, symbol)
+                                          for symbol in symbols))
+        # 整輪解析完成後才一次寫入新對照與失敗紀錄
+        self.fetcher.mapping_store.flush()
+        self.fetcher.negative_cache.save()
+        return dict(zip(symbols, coin_ids))
+
+    async def get_multi_currency_prices(self, symbols: List[str], currencies: Sequence[str] = ('usd',),
+                                        max_retries: int = 3) -> Dict[str, Dict[str, float]]:
+        """同時送出所有批次查詢，回傳 {symbol: {currency: price}}"""
+        fetcher = self.fetcher
+        currencies = [currency.lower() for currency in currencies]
+        if not symbols or not currencies:
+            fetcher.last_failed_symbols = []
+            return {}
+
+        resolved = await self.resolve_coin_ids(symbols)
+        valid_symbols = []
+        coin_ids = []
+        for symbol, coin_id in resolved.items():
+            fetcher._collect_price_target(symbol, coin_id, currencies, valid_symbols, coin_ids)
+
+        results: Dict[str, Dict[str, float]] = {}
+        if coin_ids:
+            valid_symbols, coin_ids = fetcher._take_cached_prices(valid_symbols, coin_ids, currencies, results)
+        else:
+            print("沒有有效的幣種可以查詢")
+
+        batches = fetcher._plan_price_batches(coin_ids, currencies)
+        if batches:
+            print(f"共 {len(coin_ids)} 個幣種、{len(currencies)} 種貨幣，同時送出 {len(batches)} 次請求")
+
+        # 每批寫入各自的結果，完成後再合併，避免多個執行緒同時修改同一個 dict
+        batch_results = [{} for _ in batches]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        failed_lists = await asyncio.gather(*(
+            self._run(semaphore, fetcher._fetch_price_batch, valid_symbols[i:j], coin_ids[i:j], currencies,
+                      batch_result, max_retries)
+            for (i, j), batch_result in zip(batches, batch_results)
+        ))
+        for batch_result in batch_results:
+            results.update(batch_result)
+
+        failed_symbols = [symbol for failed in failed_lists for symbol in failed]
+        fetcher._finish_price_request(list(resolved), results, failed_symbols)
+        return results
+
+    async def get_batch_prices(self, symbols: List[str], currency: str = 'usd') -> Dict[str, float]:
+        """同時查詢多個幣種單一貨幣的價格"""
+        results = await self.get_multi_currency_prices(symbols, [currency])
+        return self.fetcher._flatten_prices(results, currency)
+
+    async def get_single_price(self, symbol: str, currency: str = 'usd') -> Optional[float]:
+        """查詢單一幣種價格；同時查詢相同幣種時由 fetcher 的 single-flight 合併為一次請求"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.fetcher.get_single_price, symbol, currency)
+
+    async def search_coins(self, queries: List[str]) -> Dict[str, List[Dict]]:
+        """同時搜尋多個關鍵字"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(self._run(semaphore, self.fetcher.search_coin, query)
+                                         for query in queries))
+        return dict(zip(queries, results))
+
+    async def get_market_data(self, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        """同時取得多個幣種的詳細市場資料"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(self._run(semaphore, self.fetcher.get_market_data, symbol)
+                                         for symbol in symbols))
+        return dict(zip(symbols, results))
+
+    def run_sync(self, coroutine):
+        """在同步程式中執行協程；若目前執行緒已有事件迴圈，改在另一個執行緒執行"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+
+        outcome = {}
+
+        def runner():
+            try:
+                outcome['result'] = asyncio.run(coroutine)
+            except BaseException as e:
+                outcome['error'] = e
+
+        thread = threading.Thread(target=runner, daemon=True)
+        thread.start()
+        thread.join()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def get_multi_currency_prices_sync(self, symbols: List[str], currencies: Sequence[str] = ('usd',)) -> Dict[str, Dict[str, float]]:
+        """get_multi_currency_prices 的同步版本"""
+        return self.run_sync(self.get_multi_currency_prices(symbols, currencies))
+
+    def get_batch_prices_sync(self, symbols: List[str], currency: str = 'usd') -> Dict[str, float]:
+        """get_batch_prices 的同步版本"""
+        return self.run_sync(self.get_batch_prices(symbols, currency))
+
+    def close(self):
+        """關閉執行緒池"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,109 @@
+"""帳戶頁面解析效能測試：量測每秒（單核）可解析的頁面數，低於目標時以非零狀態結束
+
+目標依步驟 1 的下載速度推算：--workers 個並行下載、每頁回應至少 --page-seconds 秒時，
+每秒最多送達 workers / page_seconds 頁（預設 8 / 0.16 = 50 頁）。單核解析至少要跟上這個速度，
+解析才不會成為爬取的瓶頸；提高 SCRAPE_MAX_WORKERS 時目標也要跟著提高。
+
+使用方式：
+    python benchmarks/bench_account_parser.py
+    python benchmarks/bench_account_parser.py --parser text --min-pages-per-sec 150
+    python benchmarks/bench_account_parser.py --embedded   # 頁面含內嵌狀態 JSON
+    python benchmarks/bench_account_parser.py --workers 16  # 依 SCRAPE_MAX_WORKERS 調整目標
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from account_parser import lxml, parse_account_page  # noqa: E402
+from benchmarks.sample_pages import make_account_page  # noqa: E402
+
+# 與 config_template.py 的 SCRAPE_MAX_WORKERS 預設值相同
+DEFAULT_SCRAPE_WORKERS = 8
+# 保持連線時帳戶頁面最快的回應時間（秒）
+DEFAULT_PAGE_SECONDS = 0.16
+
+
+def measure(pages, parser: str, min_seconds: float) -> float:
+    """重複解析頁面至少 min_seconds 秒，回傳每秒頁數"""
+    # 暖身，避免第一次載入模組的時間影響結果
+    parse_account_page(pages[0], parser)
+    count = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        for page in pages:
+            parse_account_page(page, parser)
+        count += len(pages)
+        elapsed = time.perf_counter() - started
+    return count / elapsed
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--parser', choices=['lxml', 'text', 'bs4', 'all'], default='all')
+    arg_parser.add_argument('--min-pages-per-sec', type=float, default=None,
+                            help='每個解析器每秒（單核）至少要解析的頁面數，預設為 workers / page-seconds')
+    arg_parser.add_argument('--workers', type=int, default=DEFAULT_SCRAPE_WORKERS, help='步驟 1 的並行下載數')
+    arg_parser.add_argument('--page-seconds', type=float, default=DEFAULT_PAGE_SECONDS,
+                            help='每頁最快的下載時間（秒）')
+    arg_parser.add_argument('--trades', type=int, default=200, help='每個頁面的交易紀錄筆數')
+    arg_parser.add_argument('--seconds', type=float, default=2.0, help='每個解析器的量測時間')
+    arg_parser.add_argument('--embedded', action='store_true', help='頁面加入 __NEXT_DATA__ 內嵌狀態')
+    args = arg_parser.parse_args()
+    if args.min_pages_per_sec is None:
+        args.min_pages_per_sec = args.workers / args.page_seconds
+        print(f"目標: {args.workers} 個並行下載 / 每頁 {args.page_seconds} 秒 = {args.min_pages_per_sec:.0f} 頁/秒")
+
+    # 解析時會印出倉位匹配訊息，量測期間先關閉
+    pages = [make_account_page(trades=args.trades, seed=seed, embedded=args.embedded) for seed in range(20)]
+    parsers = ['lxml', 'text', 'bs4'] if args.parser == 'all' else [args.parser]
+    failed = False
+    if lxml is None and 'lxml' in parsers:
+        parsers.remove('lxml')
+        if args.parser == 'lxml':
+            # 明確指定 lxml 卻無法量測時不能當作通過
+            print(" lxml: 未安裝 lxml，無法量測")
+            failed = True
+        else:
+            print(" lxml: 略過（未安裝 lxml）")
+
+    measured = 0
+    stdout = sys.stdout
+    for parser in parsers:
+        try:
+            sys.stdout = open(os.devnull, 'w')
+            pages_per_sec = measure(pages, parser, args.seconds)
+        except ImportError as e:
+            sys.stdout = stdout
+            print(f"{parser:>5}: 略過（{e}）")
+            if args.parser == parser:
+                failed = True
+            continue
+        finally:
+            if sys.stdout is not stdout:
+                sys.stdout.close()
+                sys.stdout = stdout
+        measured += 1
+        # bs4 為原本的解析方式，只作為比較基準，不套用目標
+        enforced = parser != 'bs4'
+        passed = pages_per_sec >= args.min_pages_per_sec
+        margin = pages_per_sec / args.min_pages_per_sec
+        status = '（比較基準）' if not enforced else ('通過' if passed else '未達標')
+        print(f"{parser:>5}: {pages_per_sec:8.1f} 頁/秒，目標的 {margin:.2f} 倍 {status}")
+        if enforced and not passed:
+            failed = True
+
+    if not measured:
+        print("沒有量測任何解析器")
+        return 1
+    if failed:
+        print(f"未達目標 {args.min_pages_per_sec} 頁/秒或指定的解析器無法量測")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
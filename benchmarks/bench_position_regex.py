@@ -0,0 +1,89 @@
+"""倉位比對效能測試：比較原本逐一嘗試三個正則的方式與預先編譯的合併正則
+
+使用方式：
+    python benchmarks/bench_position_regex.py
+    python benchmarks/bench_position_regex.py --trades 1000 --seconds 2
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from account_parser import PageText, clean_monetary_value, iter_positions  # noqa: E402
+from benchmarks.sample_pages import make_account_page  # noqa: E402
+
+# 原本 scrape_block_explorer_data 中的寫法，作為比較基準
+LEGACY_POSITION_PATTERNS = [
+    r'([A-Z]{2,10})Size:\s*([\d\.]+)\s*Side:\s*(SHORT|LONG)\s*Realized PnL:\s*([$\-\d,\.]+)\s*Unrealized PnL:\s*([$\-\d,\.]+)',
+    r'([A-Z0-9]{2,10})Size:\s*([\d\.]+)\s*Side:\s*(SHORT|LONG)\s*Realized PnL:\s*([$\-\d,\.]+)\s*Unrealized PnL:\s*([$\-\d,\.]+)',
+    r'Size:\s*([\d\.]+)\s*Side:\s*(SHORT|LONG)\s*Realized PnL:\s*([$\-\d,\.]+)\s*Unrealized PnL:\s*([$\-\d,\.]+)',
+]
+
+
+def legacy_positions(text):
+    for pattern in LEGACY_POSITION_PATTERNS:
+        matches = re.findall(pattern, text)
+        if matches:
+            return matches
+    return []
+
+
+def legacy_clean_monetary_value(value):
+    if not value:
+        return value
+    value_str = str(value).replace('$', '').replace('＄', '').strip()
+    cleaned = re.sub(r'[^\d\-\.]', '', value_str)
+    if cleaned.count('.') > 1:
+        parts = cleaned.split('.')
+        cleaned = parts[0] + '.' + ''.join(parts[1:])
+    return cleaned
+
+
+def measure(func, items, min_seconds: float) -> float:
+    """重複執行至少 min_seconds 秒，回傳每秒處理的項目數"""
+    for item in items[:1]:
+        func(item)
+    count = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        for item in items:
+            func(item)
+        count += len(items)
+        elapsed = time.perf_counter() - started
+    return count / elapsed
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--trades', type=int, default=200, help='每個頁面的交易紀錄筆數')
+    arg_parser.add_argument('--seconds', type=float, default=1.0, help='每個項目的量測時間')
+    args = arg_parser.parse_args()
+
+    pages = [make_account_page(trades=args.trades, seed=seed) for seed in range(20)]
+    texts = [PageText.from_html(page, 'text').text for page in pages]
+    # 沒有幣種代碼的頁面：原本的寫法要掃描三次才會找到倉位
+    texts_without_symbol = [re.sub(r'[A-Z][A-Z0-9]{1,9}(?=Size:)', '', text) for text in texts]
+
+    for legacy, current in zip(texts, texts):
+        assert [tuple(p) for p in iter_positions(current)] == legacy_positions(legacy), '比對結果與原本不同'
+
+    cases = [
+        ('倉位（含幣種）', texts, lambda t: legacy_positions(t), lambda t: list(iter_positions(t))),
+        ('倉位（無幣種）', texts_without_symbol, lambda t: legacy_positions(t), lambda t: list(iter_positions(t))),
+    ]
+    amounts = ['$12,345.67', '-$1,234.5', '＄987.65', '$0.00', '$3,265,300.12'] * 20
+    cases.append(('金額清理', amounts, legacy_clean_monetary_value, clean_monetary_value))
+
+    for name, items, legacy_func, current_func in cases:
+        legacy_rate = measure(legacy_func, items, args.seconds)
+        current_rate = measure(current_func, items, args.seconds)
+        print(f"{name}: 原本 {legacy_rate:10.1f}/秒，現在 {current_rate:10.1f}/秒，{current_rate / legacy_rate:.2f} 倍")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
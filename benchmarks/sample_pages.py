@@ -0,0 +1,57 @@
+"""產生與 Lighter 帳戶頁面結構相近的測試頁面，供效能測試使用"""
+import json
+import random
+
+
+def make_account_page(positions=2, trades=200, seed=0, embedded=False) -> str:
+    """建立帳戶頁面：地址、餘額、抵押、倉位，以及長長的交易紀錄
+
+    embedded=True 時另外加入 __NEXT_DATA__ 內嵌狀態（與 Lighter 帳戶 API 相同的欄位）。
+    """
+    rng = random.Random(seed)
+    symbols = ['ETH', 'BTC', 'AI16Z', 'LDO', 'SOL', 'DOGE', 'WIF', 'ARB']
+    address = f'0x{rng.getrandbits(160):040x}'
+    balance = rng.uniform(100, 100000)
+    collateral = rng.uniform(100, 100000)
+    position_blocks = []
+    position_json = []
+    for i in range(positions):
+        symbol = symbols[i % len(symbols)]
+        size = rng.uniform(1, 5000)
+        side = rng.choice(["LONG", "SHORT"])
+        realized, unrealized = rng.uniform(-500, 500), rng.uniform(-500, 500)
+        position_blocks.append(
+            f'<div class="position"><span class="symbol">{symbol}</span>'
+            f'<span>Size: {size:.1f}</span> <span>Side: {side}</span> '
+            f'<span>Realized PnL: ${realized:,.2f}</span> '
+            f'<span>Unrealized PnL: ${unrealized:,.2f}</span></div>'
+        )
+        position_json.append({
+            'market_id': i, 'symbol': symbol, 'sign': 1 if side == 'LONG' else -1, 'position': f'{size:.1f}',
+            'realized_pnl': f'{realized:.2f}', 'unrealized_pnl': f'{unrealized:.2f}',
+        })
+    state = ''
+    if embedded:
+        account = {'index': 53015, 'l1_address': address, 'collateral': f'{collateral:.2f}',
+                   'total_asset_value': f'{balance:.2f}', 'positions': position_json}
+        state = ('<script id="__NEXT_DATA__" type="application/json">'
+                 + json.dumps({'props': {'pageProps': {'account': account}}}) + '</script>')
+    trade_rows = ''.join(
+        f'<tr><td>{rng.choice(symbols)}</td><td>{rng.uniform(0.1, 100):.3f}</td>'
+        f'<td>${rng.uniform(1, 60000):,.2f}</td><td>2024-01-{1 + i % 28:02d} 12:{i % 60:02d}</td></tr>'
+        for i in range(trades)
+    )
+    return (
+        '<!DOCTYPE html><html><head><title>Account 53015 | Lighter Explorer</title>'
+        '<style>.position{display:flex}</style>'
+        '<script>window.analytics = {"page": "account"};</script></head><body>'
+        '<nav><a href="/">Lighter</a><a href="/blocks">Blocks</a></nav>'
+        '<main><h1>Account 53015</h1>'
+        f'<div class="address">{address}</div>'
+        f'<div class="balance">${balance:,.2f}</div>'
+        f'<div class="change">${rng.uniform(-1000, 1000):,.2f}</div>'
+        f'<div class="stats">Collateral Amount: ${collateral:,.2f} Open Positions: {positions}</div>'
+        f'<section class="positions">{"".join(position_blocks)}</section>'
+        f'<table class="trades"><tbody>{trade_rows}</tbody></table>'
+        f'</main><!-- footer --><footer>Lighter Explorer</footer>{state}</body></html>'
+    )
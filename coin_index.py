@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# 名稱或 ID 含有這些字的幣種通常是跨鏈、包裝或錨定版本，同名時排在後面
+_DERIVATIVE_MARKERS = ('wrapped', 'bridged', 'peg', 'wormhole', 'binance-peg', 'staked')
+
+
+class CoinListIndex:
+    """CoinGecko 幣種清單的本地索引：symbol -> 候選 ID，定期重新下載
+
+    同一 symbol 對應多個幣種時的排序規則：
+      1. 市值排名（有排名的優先，排名越前面越優先）
+      2. 非跨鏈／包裝版本優先
+      3. ID 較短者優先（通常是原生幣種）
+    """
+
+    def __init__(self, path: Optional[str] = 'coin_list_index.json', refresh_hours: float = 24, rank_pages: int = 4):
+        self.path = path
+        self.refresh_hours = refresh_hours
+        self.rank_pages = rank_pages
+        self.updated_at = 0.0
+        self._coins: List[List[str]] = []       # [id, symbol, name]
+        self._ranks: Dict[str, int] = {}        # id -> 市值排名
+        self._by_symbol: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._refresh_checked = False
+        self._refresh_done = threading.Event()
+        self.load()
+
+    def __len__(self):
+        return len(self._coins)
+
+    def is_stale(self) -> bool:
+        """索引是否已超過更新週期"""
+        return not self._coins or time.time() - self.updated_at > self.refresh_hours * 3600
+
+    def load(self):
+        """從磁碟載入索引"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._set_data(data.get('coins', []), data.get('ranks', {}), data.get('updated_at', 0.0))
+            print(f"已從 {self.path} 載入 {len(self._coins)} 個幣種索引")
+        except Exception as e:
+            print(f"載入幣種索引時發生錯誤: {e}")
+
+    def save(self):
+        """將索引保存到磁碟"""
+        if not self.path:
+            return
+        data = {'updated_at': self.updated_at, 'coins': self._coins, 'ranks': self._ranks}
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"儲存幣種索引時發生錯誤: {e}")
+
+    def refresh(self, http_get, base_url: str) -> bool:
+        """從 CoinGecko 下載幣種清單與市值排名並重建索引（http_get 與 requests.get 參數相同）"""
+        try:
+            print("正在更新 CoinGecko 幣種索引...")
+            response = http_get(f"{base_url}/coins/list", timeout=60)
+            response.raise_for_status()
+            coins = [[coin['id'], coin['symbol'], coin.get('name', '')] for coin in response.json()]
+
+            # 取得市值前幾頁的排名，用來決定同名幣種的優先順序
+            ranks = {}
+            for page in range(1, self.rank_pages + 1):
+                params = {
+                    'vs_currency': 'usd',
+                    'order': 'market_cap_desc',
+                    'per_page': 250,
+                    'page': page,
+                }
+                response = http_get(f"{base_url}/coins/markets", params=params, timeout=30)
+                response.raise_for_status()
+                for market in response.json():
+                    if market.get('market_cap_rank'):
+                        ranks[market['id']] = market['market_cap_rank']
+        except Exception as e:
+            print(f"更新幣種索引時發生錯誤: {e}")
+            return False
+
+        self._set_data(coins, ranks, time.time())
+        self.save()
+        print(f"幣種索引更新完成: {len(coins)} 個幣種，{len(ranks)} 個有市值排名")
+        return True
+
+    def ensure_fresh(self, http_get, base_url: str):
+        """索引過期時重新下載（每個執行期間只檢查一次）
+
+        其他執行緒在更新進行中呼叫時會等到更新結束，避免在沒有索引的情況下全部改用搜尋 API。
+        """
+        with self._lock:
+            checked = self._refresh_checked
+            self._refresh_checked = True
+            stale = not checked and self.is_stale()
+        if checked:
+            self._refresh_done.wait()
+            return
+        # 更新時 _set_data 會再取得鎖，因此在鎖外執行
+        try:
+            if stale:
+                self.refresh(http_get, base_url)
+        finally:
+            self._refresh_done.set()
+
+    def candidates(self, symbol: str) -> List[str]:
+        """依排序規則回傳 symbol 對應的所有候選 ID"""
+        return list(self._by_symbol.get(symbol.strip().upper(), []))
+
+    def resolve(self, symbol: str) -> Optional[str]:
+        """回傳 symbol 最可能對應的 CoinGecko ID"""
+        ids = self._by_symbol.get(symbol.strip().upper())
+        return ids[0] if ids else None
+
+    def _set_data(self, coins: List[List[str]], ranks: Dict[str, int], updated_at: float):
+        names = {}
+        by_symbol: Dict[str, List[str]] = {}
+        for coin_id, coin_symbol, name in coins:
+            by_symbol.setdefault(coin_symbol.upper(), []).append(coin_id)
+            names[coin_id] = name.lower()
+
+        def rank_key(coin_id):
+            text = f"{coin_id} {names.get(coin_id, '')}"
+            is_derivative = any(marker in text for marker in _DERIVATIVE_MARKERS)
+            return (ranks.get(coin_id, float('inf')), is_derivative, len(coin_id), coin_id)
+
+        for ids in by_symbol.values():
+            ids.sort(key=rank_key)
+
+        with self._lock:
+            self._coins = coins
+            self._ranks = ranks
+            self._by_symbol = by_symbol
+            self.updated_at = updated_at
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """跨行程的檔案鎖（Linux/macOS 使用 fcntl，Windows 使用 msvcrt）"""
+    with open(lock_path, 'a+') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CoinMappingStore:
+    """幣種對照表的持久化：新增項目先累積在記憶體，批次附加到日誌檔，定期壓縮回 coin_mapping.json
+
+    日誌檔每行一筆 {"symbol": ..., "id": ...}，讀取時以對照表檔為基礎依序套用。
+    寫入時使用執行緒鎖與檔案鎖，可同時由多個執行緒或行程使用。
+    """
+
+    def __init__(self, path: str = 'coin_mapping.json', compact_threshold: int = 200):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.lock_path = f"{path}.lock"
+        self.compact_threshold = compact_threshold
+        self._pending: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, str]:
+        """讀取對照表檔並套用日誌中的新增項目"""
+        with self._lock, _file_lock(self.lock_path):
+            mapping, _ = self._read_all()
+        return mapping
+
+    def add(self, symbol: str, coin_id: str):
+        """新增一筆對照（先保存在記憶體，呼叫 flush 時才寫入）"""
+        with self._lock:
+            self._pending.append((symbol.upper(), coin_id))
+
+    def flush(self):
+        """將累積的新增項目一次附加到日誌檔，日誌過長時自動壓縮"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending = self._pending
+            self._pending = []
+            lines = ''.join(json.dumps({'symbol': symbol, 'id': coin_id}, ensure_ascii=False) + '\n'
+                            for symbol, coin_id in pending)
+            try:
+                with _file_lock(self.lock_path):
+                    with open(self.journal_path, 'a', encoding='utf-8') as f:
+                        f.write(lines)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    if self._journal_length() >= self.compact_threshold:
+                        self._compact_locked()
+                print(f"已寫入 {len(pending)} 筆新對照到 {self.journal_path}")
+            except Exception as e:
+                # 寫入失敗時放回待寫清單，下次再試
+                self._pending = pending + self._pending
+                print(f"寫入對照表日誌時發生錯誤: {e}")
+
+    def compact(self):
+        """將日誌合併回對照表檔並清空日誌"""
+        with self._lock, _file_lock(self.lock_path):
+            self._compact_locked()
+
+    def save_all(self, mapping: Dict[str, str]):
+        """以完整對照表覆寫對照表檔，並清空日誌"""
+        with self._lock, _file_lock(self.lock_path):
+            self._write_snapshot(mapping)
+            self._truncate_journal()
+
+    def _read_all(self) -> Tuple[Dict[str, str], int]:
+        mapping = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                mapping.update(json.load(f))
+        entry_count = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 中斷時可能留下不完整的最後一行，直接略過
+                        continue
+                    mapping[entry['symbol']] = entry['id']
+                    entry_count += 1
+        return mapping, entry_count
+
+    def _journal_length(self) -> int:
+        if not os.path.exists(self.journal_path):
+            return 0
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            return sum(1 for _ in f)
+
+    def _compact_locked(self):
+        mapping, entry_count = self._read_all()
+        if not entry_count:
+            return
+        self._write_snapshot(mapping)
+        self._truncate_journal()
+        print(f"已壓縮對照表日誌: {entry_count} 筆合併到 {self.path}")
+
+    def _write_snapshot(self, mapping: Dict[str, str]):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(mapping, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def _truncate_journal(self):
+        if os.path.exists(self.journal_path):
+            open(self.journal_path, 'w').close()
@@ -1,12 +1,82 @@
 import requests
 import time
-from typing import Dict, List, Optional
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import quote
 import json
 
+from http_client import PooledHttpSession
+from coin_index import CoinListIndex
+from coin_mapping_store import CoinMappingStore
+from negative_cache import NegativeCache
+from rate_limiter import RateLimiter
+from single_flight import SingleFlight
+from ttl_cache import TTLCache
+
+class MarketData(NamedTuple):
+    """/coins/markets 中本專案使用的欄位"""
+    coin_id: str
+    symbol: str
+    price: Optional[float]
+    market_cap: Optional[float]
+    total_volume: Optional[float]
+    price_change_24h: Optional[float]
+    price_change_percentage_24h: Optional[float]
+    last_updated: Optional[str]
+
+    @classmethod
+    def from_market(cls, symbol: str, market: Dict) -> 'MarketData':
+        return cls(
+            coin_id=market['id'],
+            symbol=symbol,
+            price=market.get('current_price'),
+            market_cap=market.get('market_cap'),
+            total_volume=market.get('total_volume'),
+            price_change_24h=market.get('price_change_24h'),
+            price_change_percentage_24h=market.get('price_change_percentage_24h'),
+            last_updated=market.get('last_updated'),
+        )
+
 class CoinGeckoPriceFetcher:
-    def __init__(self):
+    def __init__(self, session: Optional[PooledHttpSession] = None, price_cache: Optional[TTLCache] = None,
+                 coin_index: Optional[CoinListIndex] = None, negative_cache: Optional[NegativeCache] = None,
+                 mapping_store: Optional[CoinMappingStore] = None, rate_limiter: Optional[RateLimiter] = None,
+                 max_url_length: int = 2000, market_cache: Optional[TTLCache] = None):
         self.base_url = "https://api.coingecko.com/api/v3"
         
+        # /simple/price 請求網址長度上限，批次查詢時依此決定每次放入多少 ID
+        self.max_url_length = max_url_length
+        
+        # 合併同時進行的相同價格查詢與搜尋請求
+        self.single_flight = SingleFlight()
+        
+        # 最近一次批次查價中無法查詢的 symbol
+        self.last_failed_symbols: List[str] = []
+        
+        # 所有 API 呼叫共用的限流器（免費方案約每分鐘 30 次）
+        self.rate_limiter = rate_limiter or RateLimiter(calls_per_minute=30)
+        
+        # 對照表持久化：新增項目寫入日誌，解析完一輪後才批次寫入
+        self.mapping_store = mapping_store or CoinMappingStore()
+        
+        # 查不到 ID 或價格的負面快取，與 coin_mapping.json 放在同一目錄
+        self.negative_cache = negative_cache or NegativeCache()
+        
+        # 本地幣種索引，找不到對照時優先使用，減少 /search 請求
+        self.coin_index = coin_index or CoinListIndex()
+        
+        # 價格快取，鍵為 (coin_id, currency)，未指定時只保存在記憶體中
+        self.price_cache = price_cache or TTLCache(ttl_seconds=300, max_entries=2000)
+        
+        # 市場資料快取，鍵為 (coin_id, currency)，值為 MarketData 欄位清單
+        self.market_cache = market_cache or TTLCache(ttl_seconds=300, max_entries=2000)
+        
+        # 共用連線池，所有 API 呼叫共用同一組 keep-alive 連線
+        self.session = session or PooledHttpSession(
+            headers={'Accept': 'application/json'},
+            timeout=15,
+            pool_maxsize=4,
+        )
+        
         # 常見幣種的 symbol 到 CoinGecko ID 對照表
         self.symbol_to_id = {
             'AVAX': 'avalanche-2',
@@ -120,6 +190,18 @@ class CoinGeckoPriceFetcher:
         except:
             pass
     
+    def _get(self, url: str, params: Optional[Dict] = None, **kwargs) -> requests.Response:
+        """經過限流器的 GET 請求，收到 429 時依 Retry-After 暫停所有後續請求"""
+        self.rate_limiter.acquire()
+        response = self.session.get(url, params=params, **kwargs)
+        if response.status_code == 429:
+            wait_time = self.rate_limiter.on_rate_limited(response.headers.get('Retry-After'))
+            print(f"API配額限制，暫停所有請求 {wait_time:.0f} 秒"
+                  f"（速率調整為每分鐘 {self.rate_limiter.current_calls_per_minute:.0f} 次）")
+        else:
+            self.rate_limiter.on_success()
+        return response
+    
     def get_symbol_id(self, symbol: str) -> Optional[str]:
         """根據 symbol 取得 CoinGecko ID"""
         return self.symbol_to_id.get(symbol.upper())
@@ -133,7 +215,7 @@ class CoinGeckoPriceFetcher:
         try:
             url = f"{self.base_url}/search"
             params = {"query": query}
-            response = requests.get(url, params=params, timeout=10)
+            response = self._get(url, params=params)
             response.raise_for_status()
             
             data = response.json()
@@ -148,21 +230,32 @@ class CoinGeckoPriceFetcher:
             return None
             
         symbol = symbol.strip().upper()
-        coin_id = self.get_symbol_id(symbol)
-        
-        # 如果找不到對照，嘗試簡單搜尋
-        if not coin_id:
-            print(f"找不到 {symbol} 的 CoinGecko ID，嘗試搜尋...")
-            coin_id = self._simple_search_coin_id(symbol)
-            if coin_id:
-                # 自動加入對照表
-                self.add_custom_symbol(symbol, coin_id)
-                print(f"已自動新增 {symbol} -> {coin_id} 到對照表")
+        coin_id = self._resolve_coin_id(symbol)
+        self.mapping_store.flush()
         
         if not coin_id:
             print(f"無法找到 {symbol} 的 CoinGecko ID")
+            self.negative_cache.save()
+            return None
+        
+        # 先查快取
+        cached_price = self.price_cache.get((coin_id, currency))
+        if cached_price is not None:
+            return cached_price
+        
+        # 最近查不到價格的 ID 先跳過，等到下次檢查時間
+        price_key = self.negative_cache.price_key(coin_id, currency)
+        if self.negative_cache.should_skip(price_key):
+            print(f"{symbol} 最近查無價格，暫時跳過")
             return None
         
+        # 同一個 (coin_id, currency) 同時只查詢一次，其他呼叫者共用結果
+        return self.single_flight.do(('price', coin_id, currency),
+                                     lambda: self._fetch_single_price(symbol, coin_id, currency, price_key, max_retries))
+    
+    def _fetch_single_price(self, symbol: str, coin_id: str, currency: str, price_key: str,
+                            max_retries: int) -> Optional[float]:
+        """呼叫 /simple/price 查詢單一幣種價格，加入重試機制"""
         for retry_count in range(max_retries):
             try:
                 url = f"{self.base_url}/simple/price"
@@ -171,18 +264,27 @@ class CoinGeckoPriceFetcher:
                     "vs_currencies": currency
                 }
                 
-                response = requests.get(url, params=params, timeout=15)
+                response = self._get(url, params=params)
                 response.raise_for_status()
                 
                 data = response.json()
                 if coin_id in data and currency in data[coin_id]:
-                    return float(data[coin_id][currency])
+                    price = float(data[coin_id][currency])
+                    self.price_cache.set((coin_id, currency), price)
+                    self.price_cache.save()
+                    self.negative_cache.record_hit(price_key)
+                    self.negative_cache.save()
+                    return price
+                
+                # 請求成功但沒有價格資料，記錄後不再重試
+                self.negative_cache.record_miss(price_key, '沒有價格資料')
+                self.negative_cache.save()
+                return None
                 
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 429:  # Rate limit
-                    wait_time = 30 * (retry_count + 1)  # 30秒, 60秒, 90秒
-                    print(f"API配額限制，等待 {wait_time} 秒後重試 ({retry_count + 1}/{max_retries})")
-                    time.sleep(wait_time)
+                    # 限流器已依 Retry-After 暫停所有請求，下次 acquire 時會自動等待
+                    print(f"API配額限制，由限流器等待後重試 ({retry_count + 1}/{max_retries})")
                 else:
                     print(f"HTTP錯誤 (嘗試 {retry_count + 1}/{max_retries}): {e}")
                     if retry_count < max_retries - 1:
@@ -208,8 +310,54 @@ class CoinGeckoPriceFetcher:
         
         return None
     
+    def _resolve_coin_id(self, symbol: str) -> Optional[str]:
+        """取得 symbol 的 CoinGecko ID，對照表沒有時搜尋並自動加入對照表
+
+        最近搜尋失敗的 symbol 會依負面快取的檢查間隔暫時跳過。
+        """
+        coin_id = self.get_symbol_id(symbol)
+        if coin_id:
+            return coin_id
+        
+        search_key = self.negative_cache.search_key(symbol)
+        if self.negative_cache.should_skip(search_key):
+            print(f"{symbol} 最近搜尋不到 CoinGecko ID，暫時跳過")
+            return None
+        
+        # 同一個 symbol 同時只搜尋一次，其他呼叫者共用結果
+        return self.single_flight.do(('search', symbol), lambda: self._search_coin_id(symbol, search_key))
+    
+    def _search_coin_id(self, symbol: str, search_key: str) -> Optional[str]:
+        """搜尋 symbol 的 CoinGecko ID 並記錄到對照表與負面快取"""
+        # 可能剛好有另一次搜尋完成並加入對照表
+        coin_id = self.get_symbol_id(symbol)
+        if coin_id:
+            return coin_id
+        
+        print(f"找不到 {symbol} 的 CoinGecko ID，嘗試智能搜尋...")
+        coin_id = self._simple_search_coin_id(symbol)
+        if coin_id:
+            # 自動加入對照表
+            self.add_custom_symbol(symbol, coin_id)
+            print(f"已自動新增 {symbol} -> {coin_id} 到對照表")
+            self.negative_cache.record_hit(search_key)
+        else:
+            self.negative_cache.record_miss(search_key, '搜尋不到 CoinGecko ID')
+        return coin_id
+    
+    def get_stuck_symbols_report(self) -> List[Dict]:
+        """回傳一直查不到 ID 或價格的幣種清單（依失敗次數排序）"""
+        return self.negative_cache.report()
+    
     def _simple_search_coin_id(self, symbol: str) -> Optional[str]:
-        """簡單搜尋幣種 ID"""
+        """簡單搜尋幣種 ID：先查本地幣種索引，找不到才呼叫 /search"""
+        self.coin_index.ensure_fresh(self._get, self.base_url)
+        coin_id = self.coin_index.resolve(symbol)
+        if coin_id:
+            candidates = self.coin_index.candidates(symbol)
+            print(f"本地索引匹配: {symbol} -> {coin_id}（共 {len(candidates)} 個候選）")
+            return coin_id
+        
         try:
             results = self.search_coin(symbol)
             if results:
@@ -233,6 +381,7 @@ class CoinGeckoPriceFetcher:
         """批次查詢多個幣種價格，使用智能搜尋"""
         if not symbols:
             return {}
+        self.last_failed_symbols = []
         
         # 過濾出有效的 symbol 並取得對應的 ID
         valid_symbols = []
@@ -241,27 +390,30 @@ class CoinGeckoPriceFetcher:
         for symbol in symbols:
             if symbol and symbol.strip():
                 symbol_clean = symbol.strip().upper()
-                coin_id = self.get_symbol_id(symbol_clean)
+                coin_id = self._resolve_coin_id(symbol_clean)
                 
-                # 如果找不到對照，嘗試智能搜尋
-                if not coin_id:
-                    print(f"找不到 {symbol_clean} 的 CoinGecko ID，嘗試智能搜尋...")
-                    coin_id = self._simple_search_coin_id(symbol_clean)
-                    if coin_id:
-                        # 自動加入對照表
-                        self.add_custom_symbol(symbol_clean, coin_id)
-                        print(f"已自動新增 {symbol_clean} -> {coin_id} 到對照表")
-                
-                if coin_id:
+                if coin_id and self.negative_cache.should_skip(self.negative_cache.price_key(coin_id, currency)):
+                    print(f"{symbol_clean} 最近查無價格，暫時跳過")
+                elif coin_id:
                     valid_symbols.append(symbol_clean)
                     coin_ids.append(coin_id)
                 else:
                     print(f"警告: 無法找到 {symbol_clean} 的 CoinGecko ID")
+        # 整輪解析完成後才一次寫入新對照與失敗紀錄
+        self.mapping_store.flush()
+        self.negative_cache.save()
         
         if not coin_ids:
             print("沒有有效的幣種可以查詢")
             return {}
         
+        # 先從快取取得價格，只查詢快取中沒有的幣種
+        cached = {}
+        valid_symbols, coin_ids = self._take_cached_prices(valid_symbols, coin_ids, [currency], cached)
+        prices = self._flatten_prices(cached, currency)
+        if not coin_ids:
+            return prices
+        
         try:
             # 批次查詢
             url = f"{self.base_url}/simple/price"
@@ -270,31 +422,79 @@ class CoinGeckoPriceFetcher:
                 "vs_currencies": currency
             }
             
-            response = requests.get(url, params=params, timeout=15)
+            response = self._get(url, params=params)
             response.raise_for_status()
             
             data = response.json()
             
             # 將結果轉換回 symbol -> price 的格式
-            prices = {}
             for symbol, coin_id in zip(valid_symbols, coin_ids):
+                price_key = self.negative_cache.price_key(coin_id, currency)
                 if coin_id in data and currency in data[coin_id]:
                     prices[symbol] = float(data[coin_id][currency])
+                    self.price_cache.set((coin_id, currency), prices[symbol])
+                    self.negative_cache.record_hit(price_key)
                     print(f"✓ {symbol}: ${prices[symbol]}")
                 else:
+                    self.negative_cache.record_miss(price_key, '沒有價格資料')
                     print(f"✗ {symbol}: 無法取得價格")
             
-            return prices
-            
         except Exception as e:
             print(f"批次查詢價格時發生錯誤: {e}")
-            return {}
+            if self._is_id_error(e):
+                fetched = {}
+                self.last_failed_symbols = self._bisect_failed_batch(valid_symbols, coin_ids, [currency], fetched)
+                prices.update(self._flatten_prices(fetched, currency))
+            else:
+                # 網路或伺服器問題與 ID 無關，整批視為失敗，不拆分也不記錄負面快取
+                self.last_failed_symbols = list(valid_symbols)
+        
+        self.price_cache.save()
+        self.negative_cache.save()
+        return prices
     
     def get_batch_prices_with_delay(self, symbols: List[str], currency: str = 'usd', delay: float = 3.0, max_retries: int = 3) -> Dict[str, float]:
         """批次查詢多個幣種價格，加入重試機制、延遲和智能搜尋"""
-        if not symbols:
+        results = self.get_multi_currency_prices(symbols, [currency], delay=delay, max_retries=max_retries)
+        return self._flatten_prices(results, currency)
+    
+    def get_multi_currency_prices(self, symbols: List[str], currencies: Sequence[str] = ('usd',), delay: float = 0,
+                                  max_retries: int = 3) -> Dict[str, Dict[str, float]]:
+        """一次查詢多個幣種在多種貨幣下的價格，回傳 {symbol: {currency: price}}
+
+        每次 /simple/price 請求同時查詢所有 vs_currencies，並在網址長度上限內放入盡量多的 ID。
+        """
+        self.last_failed_symbols = []
+        currencies = [currency.lower() for currency in currencies]
+        if not symbols or not currencies:
             return {}
         
+        # 解析 ID 並先從快取取得價格，只查詢快取中沒有的幣種
+        results = {}
+        valid_symbols, coin_ids = self._prepare_price_request(symbols, currencies, results)
+        
+        # 批次查詢失敗且拆分後仍無法查詢的 symbol
+        failed_symbols = []
+        
+        # 依網址長度上限分批，每批一次查詢所有貨幣
+        batches = self._plan_price_batches(coin_ids, currencies)
+        if batches:
+            print(f"共 {len(coin_ids)} 個幣種、{len(currencies)} 種貨幣，分為 {len(batches)} 次請求")
+        for batch_index, (i, j) in enumerate(batches):
+            failed_symbols.extend(self._fetch_price_batch(valid_symbols[i:j], coin_ids[i:j], currencies, results,
+                                                          max_retries))
+            
+            # 批次間額外延遲（速率已由限流器控制，delay 設為 0 即可）
+            if delay > 0 and batch_index < len(batches) - 1:
+                print(f"等待 {delay} 秒後處理下一批...")
+                time.sleep(delay)
+        
+        self._finish_price_request(symbols, results, failed_symbols)
+        return results
+    
+    def _prepare_price_request(self, symbols: List[str], currencies: List[str],
+                               results: Dict[str, Dict[str, float]]) -> Tuple[List[str], List[str]]:
+        """解析所有 symbol 的 ID，將快取中的價格寫入 results，回傳仍需查詢的 (symbols, coin_ids)"""
         # 過濾出有效的 symbol 並取得對應的 ID
         valid_symbols = []
         coin_ids = []
@@ -302,111 +502,284 @@ class CoinGeckoPriceFetcher:
         for symbol in symbols:
             if symbol and symbol.strip():
                 symbol_clean = symbol.strip().upper()
-                coin_id = self.get_symbol_id(symbol_clean)
-                
-                # 如果找不到對照，嘗試智能搜尋
-                if not coin_id:
-                    print(f"找不到 {symbol_clean} 的 CoinGecko ID，嘗試智能搜尋...")
-                    coin_id = self._simple_search_coin_id(symbol_clean)
-                    if coin_id:
-                        # 自動加入對照表
-                        self.add_custom_symbol(symbol_clean, coin_id)
-                        print(f"已自動新增 {symbol_clean} -> {coin_id} 到對照表")
-                
-                if coin_id:
-                    valid_symbols.append(symbol_clean)
-                    coin_ids.append(coin_id)
-                else:
-                    print(f"警告: 無法找到 {symbol_clean} 的 CoinGecko ID")
+                coin_id = self._resolve_coin_id(symbol_clean)
+                self._collect_price_target(symbol_clean, coin_id, currencies, valid_symbols, coin_ids)
+        # 整輪解析完成後才一次寫入新對照與失敗紀錄
+        self.mapping_store.flush()
+        self.negative_cache.save()
         
         if not coin_ids:
             print("沒有有效的幣種可以查詢")
-            return {}
-        
-        results = {}
+            return [], []
         
-        # 分批處理，每批最多 50 個幣種
-        batch_size = 50
-        for i in range(0, len(coin_ids), batch_size):
-            batch_ids = coin_ids[i:i + batch_size]
-            batch_symbols = valid_symbols[i:i + batch_size]
-            
-            for retry_count in range(max_retries):
-                try:
-                    # 批次查詢
-                    url = f"{self.base_url}/simple/price"
-                    params = {
-                        "ids": ",".join(batch_ids),
-                        "vs_currencies": currency
-                    }
-                    
-                    response = requests.get(url, params=params, timeout=20)
-                    response.raise_for_status()
-                    
-                    data = response.json()
-                    
-                    # 處理結果
-                    for symbol, coin_id in zip(batch_symbols, batch_ids):
-                        if coin_id in data and currency in data[coin_id]:
-                            results[symbol] = float(data[coin_id][currency])
-                        else:
-                            print(f"警告: {symbol} 沒有價格資料")
-                    
-                    print(f"批次查詢成功: {len(batch_symbols)} 個幣種")
-                    break  # 成功則跳出重試迴圈
-                    
-                except requests.exceptions.HTTPError as e:
-                    if e.response.status_code == 429:  # Rate limit
-                        wait_time = 60 * (retry_count + 1)  # 60秒, 120秒, 180秒
-                        print(f"API配額限制，等待 {wait_time} 秒後重試 ({retry_count + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                    else:
-                        print(f"HTTP錯誤 (嘗試 {retry_count + 1}/{max_retries}): {e}")
-                        if retry_count < max_retries - 1:
-                            time.sleep(10 * (retry_count + 1))
-                        else:
-                            print(f"批次查詢失敗，嘗試單個查詢...")
-                            # 如果批次查詢失敗，嘗試單個查詢
-                            for symbol in batch_symbols:
-                                price = self.get_single_price(symbol, currency, max_retries=2)
-                                if price is not None:
-                                    results[symbol] = price
-                            break
-                            
-                except requests.exceptions.RequestException as e:
-                    print(f"網路錯誤 (嘗試 {retry_count + 1}/{max_retries}): {e}")
+        return self._take_cached_prices(valid_symbols, coin_ids, currencies, results)
+    
+    def _collect_price_target(self, symbol: str, coin_id: Optional[str], currencies: List[str],
+                              valid_symbols: List[str], coin_ids: List[str]):
+        """將已解析的 symbol 加入待查清單（最近查無價格或沒有 ID 的除外）"""
+        if coin_id and all(self.negative_cache.should_skip(self.negative_cache.price_key(coin_id, currency))
+                           for currency in currencies):
+            print(f"{symbol} 最近查無價格，暫時跳過")
+        elif coin_id:
+            valid_symbols.append(symbol)
+            coin_ids.append(coin_id)
+        else:
+            print(f"警告: 無法找到 {symbol} 的 CoinGecko ID")
+    
+    def _finish_price_request(self, symbols: List[str], results: Dict[str, Dict[str, float]],
+                              failed_symbols: List[str]):
+        """保存快取並回報查詢結果"""
+        self.price_cache.save()
+        self.negative_cache.save()
+        self.last_failed_symbols = failed_symbols
+        if failed_symbols:
+            print(f"無法查詢的幣種: {failed_symbols}")
+        print(f"價格查詢完成: {len(results)}/{len(symbols)} 個幣種成功")
+    
+    def _fetch_price_batch(self, batch_symbols: List[str], batch_ids: List[str], currencies: List[str],
+                           results: Dict[str, Dict[str, float]], max_retries: int = 3) -> List[str]:
+        """查詢一批價格並在失敗時重試，最後仍失敗則拆分批次，回傳無法查詢的 symbol"""
+        for retry_count in range(max_retries):
+            try:
+                # 批次查詢
+                data = self._request_simple_prices(batch_ids, currencies)
+                
+                # 處理結果
+                self._apply_batch_prices(batch_symbols, batch_ids, currencies, data, results)
+                
+                print(f"批次查詢成功: {len(batch_symbols)} 個幣種")
+                return []
+                
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code == 429:  # Rate limit
+                    # 限流器已依 Retry-After 暫停所有請求，下次 acquire 時會自動等待
+                    print(f"API配額限制，由限流器等待後重試 ({retry_count + 1}/{max_retries})")
+                else:
+                    print(f"HTTP錯誤 (嘗試 {retry_count + 1}/{max_retries}): {e}")
                     if retry_count < max_retries - 1:
-                        wait_time = 10 * (retry_count + 1)  # 10秒, 20秒, 30秒
-                        print(f"等待 {wait_time} 秒後重試...")
-                        time.sleep(wait_time)
+                        time.sleep(10 * (retry_count + 1))
+                    elif self._is_id_error(e):
+                        # 只有 ID 造成的 4xx 錯誤才拆分批次找出有問題的 ID
+                        return self._bisect_failed_batch(batch_symbols, batch_ids, currencies, results)
                     else:
-                        print(f"批次查詢失敗，嘗試單個查詢...")
-                        # 如果批次查詢失敗，嘗試單個查詢
-                        for symbol in batch_symbols:
-                            price = self.get_single_price(symbol, currency, max_retries=2)
-                            if price is not None:
-                                results[symbol] = price
-                        break
+                        return list(batch_symbols)
                         
+            except requests.exceptions.RequestException as e:
+                print(f"網路錯誤 (嘗試 {retry_count + 1}/{max_retries}): {e}")
+                if retry_count < max_retries - 1:
+                    wait_time = 10 * (retry_count + 1)  # 10秒, 20秒, 30秒
+                    print(f"等待 {wait_time} 秒後重試...")
+                    time.sleep(wait_time)
+                else:
+                    return list(batch_symbols)
+                    
+            except Exception as e:
+                print(f"批次查詢時發生錯誤 (嘗試 {retry_count + 1}/{max_retries}): {e}")
+                if retry_count < max_retries - 1:
+                    time.sleep(5 * (retry_count + 1))
+                else:
+                    return list(batch_symbols)
+        # 每次都遇到配額限制，整批視為失敗，下次執行時重新查詢
+        print(f"配額限制重試 {max_retries} 次仍失敗: {len(batch_symbols)} 個幣種")
+        return list(batch_symbols)
+    
+    def _plan_price_batches(self, coin_ids: List[str], currencies: List[str]) -> List[Tuple[int, int]]:
+        """依網址長度上限將 /simple/price 的 ID 分批，回傳每批的 (起點, 終點) 索引"""
+        base_length = len(f"{self.base_url}/simple/price?ids=&vs_currencies=") + len(quote(','.join(currencies), safe=''))
+        return self._plan_id_batches(coin_ids, base_length)
+    
+    def _plan_id_batches(self, coin_ids: List[str], base_length: int,
+                         max_ids: Optional[int] = None) -> List[Tuple[int, int]]:
+        """依網址長度上限（與每批 ID 數上限）將 ID 分批，回傳每批的 (起點, 終點) 索引
+
+        ID 以逗號串接後會編碼為 %2C，每個 ID 實際佔用 len(quote(id)) + 3 個字元。
+        """
+        budget = self.max_url_length - base_length
+        batches = []
+        start = 0
+        used = 0
+        for index, coin_id in enumerate(coin_ids):
+            cost = len(quote(coin_id, safe='')) + (3 if index > start else 0)
+            if index > start and (used + cost > budget or (max_ids and index - start >= max_ids)):
+                batches.append((start, index))
+                start = index
+                cost = len(quote(coin_id, safe=''))
+                used = 0
+            used += cost
+        if start < len(coin_ids):
+            batches.append((start, len(coin_ids)))
+        return batches
+    
+    def _request_simple_prices(self, coin_ids: List[str], currencies: List[str]) -> Dict:
+        """呼叫一次 /simple/price，失敗時拋出例外"""
+        url = f"{self.base_url}/simple/price"
+        params = {
+            "ids": ",".join(coin_ids),
+            "vs_currencies": ",".join(currencies)
+        }
+        response = self._get(url, params=params, timeout=20)
+        response.raise_for_status()
+        return response.json()
+    
+    def _apply_batch_prices(self, symbols: List[str], coin_ids: List[str], currencies: List[str], data: Dict,
+                            results: Dict[str, Dict[str, float]]):
+        """將 /simple/price 的回應寫入 results，並更新價格快取與負面快取"""
+        for symbol, coin_id in zip(symbols, coin_ids):
+            coin_data = data.get(coin_id) or {}
+            for currency in currencies:
+                price_key = self.negative_cache.price_key(coin_id, currency)
+                if coin_data.get(currency) is not None:
+                    price = float(coin_data[currency])
+                    results.setdefault(symbol, {})[currency] = price
+                    self.price_cache.set((coin_id, currency), price)
+                    self.negative_cache.record_hit(price_key)
+                else:
+                    self.negative_cache.record_miss(price_key, '沒有價格資料')
+                    print(f"警告: {symbol} 沒有 {currency} 價格資料")
+    
+    def _bisect_failed_batch(self, symbols: List[str], coin_ids: List[str], currencies: List[str],
+                             results: Dict[str, Dict[str, float]], max_rate_limit_retries: int = 3) -> List[str]:
+        """批次查詢失敗時遞迴對半拆分，正常的 ID 仍以批次查詢，回傳無法查詢的 symbol
+
+        通常只有少數幾個 ID 會讓整批失敗，對半拆分只需 O(log n) 次請求就能找出它們。
+        """
+        print(f"批次查詢失敗，拆分 {len(coin_ids)} 個幣種找出有問題的 ID...")
+        failed = []
+        middle = len(coin_ids) // 2
+        halves = [(symbols[:middle], coin_ids[:middle]), (symbols[middle:], coin_ids[middle:])]
+        for index, (half_symbols, half_ids) in enumerate(halves):
+            if not half_ids:
+                continue
+            for attempt in range(max_rate_limit_retries):
+                try:
+                    data = self._request_simple_prices(half_ids, currencies)
+                    self._apply_batch_prices(half_symbols, half_ids, currencies, data, results)
+                    break
                 except Exception as e:
-                    print(f"批次查詢時發生錯誤 (嘗試 {retry_count + 1}/{max_retries}): {e}")
-                    if retry_count < max_retries - 1:
-                        time.sleep(5 * (retry_count + 1))
-                    else:
-                        print(f"批次查詢失敗，嘗試單個查詢...")
-                        # 如果批次查詢失敗，嘗試單個查詢
-                        for symbol in batch_symbols:
-                            price = self.get_single_price(symbol, currency, max_retries=2)
-                            if price is not None:
-                                results[symbol] = price
+                    # 配額限制不是 ID 的問題，等限流器放行後重試同一半
+                    if self._status_code(e) == 429 and attempt < max_rate_limit_retries - 1:
+                        continue
+                    if self._is_id_error(e):
+                        failed.extend(self._split_or_fail(half_symbols, half_ids, currencies, results, e))
                         break
+                    # 網路或伺服器問題：停止拆分，其餘幣種全部視為失敗，不記錄負面快取
+                    print(f"拆分查詢時發生非 ID 錯誤，停止拆分: {e}")
+                    for remaining_symbols, _ in halves[index:]:
+                        failed.extend(remaining_symbols)
+                    return failed
+        return failed
+    
+    @staticmethod
+    def _status_code(error: Exception) -> Optional[int]:
+        response = getattr(error, 'response', None) if isinstance(error, requests.exceptions.HTTPError) else None
+        return response.status_code if response is not None else None
+    
+    @classmethod
+    def _is_id_error(cls, error: Exception) -> bool:
+        """是否為 ID 造成的錯誤（429 以外的 4xx）；網路錯誤、5xx 與其他例外都不是"""
+        status_code = cls._status_code(error)
+        return status_code is not None and 400 <= status_code < 500 and status_code != 429
+    
+    def _split_or_fail(self, symbols: List[str], coin_ids: List[str], currencies: List[str],
+                       results: Dict[str, Dict[str, float]], error: Exception) -> List[str]:
+        """單一 ID 失敗時記錄為無法查詢，否則繼續拆分"""
+        if len(coin_ids) > 1:
+            return self._bisect_failed_batch(symbols, coin_ids, currencies, results)
+        print(f"✗ {symbols[0]} ({coin_ids[0]}) 查詢失敗: {error}")
+        for currency in currencies:
+            self.negative_cache.record_miss(self.negative_cache.price_key(coin_ids[0], currency), '批次查詢失敗')
+        return [symbols[0]]
+    
+    def _take_cached_prices(self, symbols: List[str], coin_ids: List[str], currencies: List[str],
+                            results: Dict[str, Dict[str, float]]):
+        """將快取中已有的價格寫入 results，回傳仍需查詢的 (symbols, coin_ids)
+
+        只要有一種貨幣沒有快取就需要重新查詢，查詢時會一併取得所有貨幣。
+        """
+        remaining_symbols = []
+        remaining_ids = []
+        cached_count = 0
+        for symbol, coin_id in zip(symbols, coin_ids):
+            cached = {}
+            for currency in currencies:
+                cached_price = self.price_cache.get((coin_id, currency))
+                if cached_price is not None:
+                    cached[currency] = cached_price
+            if len(cached) == len(currencies):
+                results[symbol] = cached
+                cached_count += 1
+            else:
+                remaining_symbols.append(symbol)
+                remaining_ids.append(coin_id)
+        if cached_count:
+            print(f"快取命中: {cached_count} 個幣種，需查詢: {len(remaining_ids)} 個幣種")
+        return remaining_symbols, remaining_ids
+    
+    @staticmethod
+    def _flatten_prices(results: Dict[str, Dict[str, float]], currency: str) -> Dict[str, float]:
+        """將 {symbol: {currency: price}} 轉為單一貨幣的 {symbol: price}"""
+        currency = currency.lower()
+        return {symbol: prices[currency] for symbol, prices in results.items() if currency in prices}
+    
+    def get_bulk_market_data(self, symbols: List[str], currency: str = 'usd',
+                             per_page: int = 250) -> Dict[str, MarketData]:
+        """以 /coins/markets 一次取得多個幣種的市值、成交量與 24 小時漲跌，回傳 {symbol: MarketData}
+
+        每次請求最多 per_page 個幣種（CoinGecko 上限 250），結果依 market_cache 的存活時間快取。
+        """
+        currency = currency.lower()
+        results = {}
+        pending_symbols = []
+        pending_ids = []
+        unique_symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol and symbol.strip()))
+        for symbol in unique_symbols:
+            coin_id = self._resolve_coin_id(symbol)
+            if not coin_id:
+                print(f"警告: 無法找到 {symbol} 的 CoinGecko ID")
+                continue
+            cached = self.market_cache.get((coin_id, currency))
+            if cached is not None:
+                results[symbol] = MarketData(*cached)
+            else:
+                pending_symbols.append(symbol)
+                pending_ids.append(coin_id)
+        self.mapping_store.flush()
+        self.negative_cache.save()
+        
+        url = f"{self.base_url}/coins/markets"
+        base_length = len(f"{url}?vs_currency={currency}&ids=&per_page={per_page}&page=1&price_change_percentage=24h")
+        for i, j in self._plan_id_batches(pending_ids, base_length, max_ids=min(per_page, 250)):
+            batch_ids = pending_ids[i:j]
+            params = {
+                "vs_currency": currency,
+                "ids": ",".join(batch_ids),
+                "per_page": per_page,
+                "page": 1,
+                "price_change_percentage": "24h",
+            }
+            try:
+                response = self._get(url, params=params, timeout=30)
+                response.raise_for_status()
+                markets = {market['id']: market for market in response.json()}
+            except Exception as e:
+                print(f"批次取得市場資料時發生錯誤: {e}")
+                continue
             
-            # 批次間延遲
-            if i + batch_size < len(coin_ids):
-                print(f"等待 {delay} 秒後處理下一批...")
-                time.sleep(delay)
+            for symbol, coin_id in zip(pending_symbols[i:j], batch_ids):
+                market = markets.get(coin_id)
+                if not market:
+                    print(f"警告: {symbol} 沒有市場資料")
+                    continue
+                record = MarketData.from_market(symbol, market)
+                results[symbol] = record
+                self.market_cache.set((coin_id, currency), list(record))
+                # 市場資料已含目前價格，一併寫入價格快取
+                if record.price is not None:
+                    self.price_cache.set((coin_id, currency), record.price)
         
-        print(f"價格查詢完成: {len(results)}/{len(symbols)} 個幣種成功")
+        self.market_cache.save()
+        self.price_cache.save()
+        print(f"市場資料查詢完成: {len(results)}/{len(unique_symbols)} 個幣種")
         return results
     
     def get_market_data(self, symbol: str) -> Optional[Dict]:
@@ -427,7 +800,7 @@ class CoinGeckoPriceFetcher:
                 "sparkline": "false"
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self._get(url, params=params)
             response.raise_for_status()
             
             return response.json()
@@ -440,7 +813,7 @@ class CoinGeckoPriceFetcher:
         """取得趨勢幣種列表"""
         try:
             url = f"{self.base_url}/search/trending"
-            response = requests.get(url, timeout=10)
+            response = self._get(url)
             response.raise_for_status()
             
             data = response.json()
@@ -451,29 +824,39 @@ class CoinGeckoPriceFetcher:
             return []
     
     def add_custom_symbol(self, symbol: str, coin_id: str):
-        """新增自定義的 symbol 對照"""
+        """新增自定義的 symbol 對照（寫入日誌，呼叫 mapping_store.flush() 時才存檔）"""
         self.symbol_to_id[symbol.upper()] = coin_id
         self.id_to_symbol[coin_id] = symbol.upper()
         print(f"已新增 {symbol} -> {coin_id} 的對照")
-        # 自動保存到檔案
-        self.save_mapping()
+        self.mapping_store.add(symbol, coin_id)
     
-    def save_mapping(self, filename: str = "coin_mapping.json"):
-        """儲存對照表到檔案"""
+    def save_mapping(self, filename: Optional[str] = None):
+        """儲存完整對照表到檔案（預設為對照表存放位置，並清空日誌）"""
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.symbol_to_id, f, indent=2, ensure_ascii=False)
+            if filename is None or filename == self.mapping_store.path:
+                self.mapping_store.flush()
+                self.mapping_store.save_all(self.symbol_to_id)
+                filename = self.mapping_store.path
+            else:
+                with open(filename, 'w', encoding='utf-8') as f:
+                    json.dump(self.symbol_to_id, f, indent=2, ensure_ascii=False)
             print(f"對照表已儲存到 {filename}")
         except Exception as e:
             print(f"儲存對照表時發生錯誤: {e}")
     
-    def load_mapping(self, filename: str = "coin_mapping.json"):
-        """從檔案載入對照表"""
+    def load_mapping(self, filename: Optional[str] = None):
+        """從檔案載入對照表（預設為對照表存放位置，並套用日誌中的新增項目）"""
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.symbol_to_id.update(data)
-                self.id_to_symbol = {v: k for k, v in self.symbol_to_id.items()}
+            if filename is None or filename == self.mapping_store.path:
+                data = self.mapping_store.load()
+                filename = self.mapping_store.path
+            else:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            self.symbol_to_id.update(data)
+            # 只更新載入的項目，不重建整個反向對照表
+            for symbol, coin_id in data.items():
+                self.id_to_symbol[coin_id] = symbol
             print(f"已從 {filename} 載入對照表")
         except Exception as e:
             print(f"載入對照表時發生錯誤: {e}")
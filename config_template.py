@@ -102,15 +102,110 @@ SUPPORTED_EXPLORERS = {
 COINGECKO_API_BASE_URL = "https://api.coingecko.com/api/v3"
 COINGECKO_API_DELAY = 1.2  # API 呼叫間隔（秒）
 COINGECKO_MAX_RETRIES = 3  # 最大重試次數
+COINGECKO_CALLS_PER_MINUTE = 30  # 每分鐘呼叫上限（免費方案約 30，付費方案依方案調整，例如 500）
+COINGECKO_MAX_URL_LENGTH = 2000  # 批次查價的網址長度上限，每次請求在此長度內放入盡量多的幣種
+COINGECKO_MAX_CONCURRENCY = 4  # 同時進行的 CoinGecko 請求數（總速率仍受每分鐘呼叫上限控制）
+
+# 價格來源設定（依序使用，前一個來源過慢或查不到時使用下一個）
+PRICE_PROVIDERS = ['coingecko']  # 可加入 'lighter'，例如 ['coingecko', 'lighter']
+LIGHTER_API_BASE_URL = "https://mainnet.zklighter.elliot.ai"  # Lighter 交易所 API
+PRICE_HEDGE_PERCENTILE = 0.9  # 主要來源超過此延遲百分位數仍未回應時，同時查詢下一個來源
+PRICE_HEDGE_DEFAULT_DELAY = 2.0  # 延遲紀錄不足時的等待秒數
+
+# 即時價格設定（需要安裝 websocket-client）
+PRICE_STREAM = False  # 啟用後在背景訂閱 Lighter WebSocket，Price 欄位直接從記憶體中的價格表更新
+PRICE_STREAM_URL = "wss://mainnet.zklighter.elliot.ai/stream"
+PRICE_STREAM_MAX_AGE = 120  # 價格表中超過此秒數未更新的價格改用 API 查詢
+PRICE_STREAM_REFRESH_MINUTES = 1  # 每隔幾分鐘將價格表寫入 Price 欄位
+PRICE_CURRENCIES = ['usd']  # 多貨幣查價時一次請求的貨幣，例如 ['usd', 'twd']
+
+# 價格快取設定
+PRICE_CACHE_TTL = 300  # 價格快取存活時間（秒）
+PRICE_CACHE_MAX_ENTRIES = 2000  # 價格快取最多保存的項目數
+PRICE_CACHE_FILE = "price_cache.json"  # 價格快取檔案（設為 None 則只保存在記憶體）
+MARKET_DATA_CACHE_TTL = 300  # 市場資料（市值、成交量、24h 漲跌）快取存活時間（秒）
+MARKET_DATA_CACHE_FILE = None  # 市場資料快取檔案（設為 None 則只保存在記憶體）
+
+# 本地幣種索引設定（取代逐一呼叫 /search）
+COIN_INDEX_FILE = "coin_list_index.json"  # 幣種索引檔案
+COIN_INDEX_REFRESH_HOURS = 24  # 索引更新週期（小時）
+COIN_INDEX_RANK_PAGES = 4  # 下載市值排名的頁數（每頁 250 個，用於同名幣種排序）
+
+# 幣種對照表設定：新增的對照先寫入 coin_mapping.json.journal，累積到門檻後合併
+COIN_MAPPING_FILE = "coin_mapping.json"
+COIN_MAPPING_COMPACT_THRESHOLD = 200  # 日誌累積多少筆後合併回對照表
+
+# 負面快取設定：查不到 ID 或價格的幣種依指數遞增的間隔重新檢查
+NEGATIVE_CACHE_FILE = "coin_negative_cache.json"  # 與 coin_mapping.json 放在同一目錄
+NEGATIVE_CACHE_BASE_INTERVAL = 3600  # 第一次失敗後的重新檢查間隔（秒）
+NEGATIVE_CACHE_MAX_INTERVAL = 604800  # 重新檢查間隔上限（秒，預設 7 天）
 
 # 批次處理設定
 BATCH_SIZE = 10  # 批次更新的大小
 BATCH_DELAY = 2  # 批次間隔（秒）
+SHEETS_MAX_PAYLOAD_BYTES = 1000000  # 單次批次寫入請求的內容大小上限（位元組）
+
+# 差異寫入設定：只寫入與試算表現有值不同的儲存格
+DIFF_WRITES = True
+# 不論是否變動都會寫入的欄位（COLUMN_MAPPINGS 的欄位名稱）
+ALWAYS_TOUCH_FIELDS = ['last_updated']
 
 # 重試設定
 MAX_RETRIES = 3  # 最大重試次數
 RETRY_DELAY = 5  # 重試延遲（秒）
 
+# ============================================================================
+# 爬取設定
+# ============================================================================
+
+# 並行爬取的最大執行緒數（設為 1 則逐一爬取）
+SCRAPE_MAX_WORKERS = 8
+
+# 同一主機最多同時進行的請求數
+SCRAPE_PER_HOST_CONCURRENCY = 4
+
+# 同一主機兩次請求之間的最小間隔（秒）
+SCRAPE_PER_HOST_DELAY = 0.25
+
+# 爬取請求的預設逾時（秒）
+HTTP_TIMEOUT = 15
+
+# 帳戶資料來源：'html'（爬取區塊瀏覽器頁面）或 'lighter_api'（直接查詢 LIGHTER_API_BASE_URL 的帳戶 API，不需解析 HTML）
+ACCOUNT_SOURCE = 'html'
+# 帳戶 API 同時進行的請求數
+ACCOUNT_API_MAX_WORKERS = 4
+
+# 帳戶頁面解析器：'lxml'（最快）、'text'（標準函式庫單次掃描，不需額外套件）或 'bs4'（原本的 BeautifulSoup）
+HTML_PARSER = 'lxml'
+
+# 串流下載：邊下載邊解析（使用 HTML_PARSER），取得抵押與前兩個倉位後即停止解析（False 則下載完整頁面再解析）
+SCRAPE_STREAMING = True
+# 單一頁面最多下載的位元組數，超過時停止下載並以已讀取的內容解析
+SCRAPE_MAX_BODY_BYTES = 5 * 1024 * 1024
+# 串流下載每次讀取的位元組數
+SCRAPE_CHUNK_SIZE = 16384
+# 提前取得所需欄位後，剩餘內容不超過此位元組數時仍讀完，讓連線可以重用（超過時關閉連線）
+SCRAPE_DRAIN_BYTES = 256 * 1024
+
+# 合併流程：爬取與查價完成後一次寫入（False 則分成步驟1、步驟2各自寫入）
+FUSED_PIPELINE = False
+
+# 背景查價：一邊爬取一邊查價（合併流程與兩步驟流程皆適用）
+PRICE_PREFETCH = True
+# 背景查價在送出未滿的批次前最多等待的時間（秒）
+PRICE_PREFETCH_LINGER = 2.0
+
+# 增量更新：只爬取新的、網址變更或 last_updated 已過期的行
+INCREMENTAL_REFRESH = False
+# last_updated 超過此分鐘數的行需要重新爬取
+INCREMENTAL_MAX_AGE_MINUTES = 60
+# 每次最多處理的行數（None 表示不限制）
+INCREMENTAL_ROW_BUDGET = 50
+# 增量更新的執行間隔（分鐘）
+INCREMENTAL_INTERVAL_MINUTES = 10
+# 記錄各行上次爬取網址的檔案
+URL_STATE_FILE = "row_url_state.json"
+
 # ============================================================================
 # 排程設定
 # ============================================================================
@@ -0,0 +1,98 @@
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+def _counting_pool_classes(on_new_connection):
+    """建立會在開新連線時回報的連線池類別"""
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        def _new_conn(self):
+            on_new_connection()
+            return super()._new_conn()
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        def _new_conn(self):
+            on_new_connection()
+            return super()._new_conn()
+
+    return {
+        'http': CountingHTTPConnectionPool,
+        'https': CountingHTTPSConnectionPool,
+    }
+
+
+class _CountingAdapter(HTTPAdapter):
+    """會統計新建連線數的 HTTPAdapter"""
+
+    def __init__(self, on_new_connection, **kwargs):
+        self._on_new_connection = on_new_connection
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _counting_pool_classes(self._on_new_connection)
+
+
+class PooledHttpSession:
+    """共用連線池的 HTTP session：保持連線、統一標頭與逾時，並統計連線重用情況"""
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, timeout: float = 15,
+                 pool_maxsize: int = 10, pool_connections: int = 10):
+        self.timeout = timeout
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+
+        # pool_maxsize 為每個主機保留的連線數，pool_connections 為快取的主機數
+        adapter = _CountingAdapter(
+            self._record_new_connection,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._request_count = 0
+        self._new_connection_count = 0
+
+    def _record_new_connection(self):
+        with self._lock:
+            self._new_connection_count += 1
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """發送請求，未指定 timeout 時使用預設值"""
+        kwargs.setdefault('timeout', self.timeout)
+        with self._lock:
+            self._request_count += 1
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """發送 GET 請求"""
+        return self.request('GET', url, **kwargs)
+
+    def get_stats(self) -> Dict[str, float]:
+        """取得連線統計：請求數、新建連線數、重用連線數與重用率"""
+        with self._lock:
+            requests_sent = self._request_count
+            new_connections = self._new_connection_count
+        reused = max(0, requests_sent - new_connections)
+        return {
+            'requests': requests_sent,
+            'new_connections': new_connections,
+            'reused_connections': reused,
+            'reuse_rate': reused / requests_sent if requests_sent else 0.0,
+        }
+
+    def format_stats(self) -> str:
+        """將連線統計整理成一行文字"""
+        stats = self.get_stats()
+        return (f"請求 {stats['requests']} 次，新建連線 {stats['new_connections']} 個，"
+                f"重用 {stats['reused_connections']} 次（重用率 {stats['reuse_rate']:.0%}）")
+
+    def close(self):
+        """關閉所有連線"""
+        self.session.close()
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class NegativeCache:
+    """記錄查不到的 symbol 或價格，以指數遞增的間隔重新檢查，避免每次執行都重複失敗的請求
+
+    第 n 次失敗後需等待 base_interval * 2^(n-1) 秒（最多 max_interval 秒）才會再次查詢。
+    """
+
+    def __init__(self, path: Optional[str] = 'coin_negative_cache.json', base_interval: float = 3600,
+                 max_interval: float = 7 * 24 * 3600):
+        self.path = path
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    @staticmethod
+    def search_key(symbol: str) -> str:
+        return f"search:{symbol.upper()}"
+
+    @staticmethod
+    def price_key(coin_id: str, currency: str) -> str:
+        return f"price:{coin_id}:{currency}"
+
+    def should_skip(self, key: str) -> bool:
+        """是否仍在等待重新檢查的期間內"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return bool(entry) and entry['next_check_at'] > time.time()
+
+    def record_miss(self, key: str, reason: str = ''):
+        """記錄一次失敗，並將下次檢查時間往後推"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.setdefault(key, {'failures': 0, 'first_seen': now})
+            entry['failures'] += 1
+            entry['last_seen'] = now
+            entry['reason'] = reason
+            interval = min(self.base_interval * (2 ** (entry['failures'] - 1)), self.max_interval)
+            entry['next_check_at'] = now + interval
+            self._dirty = True
+
+    def record_hit(self, key: str):
+        """查詢成功，移除失敗紀錄"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._dirty = True
+
+    def report(self) -> List[Dict]:
+        """回傳所有卡住的項目，依失敗次數由多到少排序"""
+        with self._lock:
+            items = [dict(entry, key=key) for key, entry in self._entries.items()]
+        return sorted(items, key=lambda item: (-item['failures'], item['key']))
+
+    def format_report(self) -> str:
+        """將卡住的項目整理成可讀的文字"""
+        items = self.report()
+        if not items:
+            return "沒有卡住的幣種"
+        lines = [f"卡住的幣種（共 {len(items)} 個）:"]
+        for item in items:
+            next_check = time.strftime('%Y/%m/%d %H:%M', time.localtime(item['next_check_at']))
+            lines.append(f"  {item['key']}: 失敗 {item['failures']} 次，下次檢查 {next_check}"
+                         + (f"（{item['reason']}）" if item.get('reason') else ''))
+        return '\n'.join(lines)
+
+    def load(self):
+        """從磁碟載入失敗紀錄"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            print(f"載入失敗紀錄 {self.path} 時發生錯誤: {e}")
+
+    def save(self):
+        """將失敗紀錄保存到磁碟（有變動時才寫入）"""
+        if not self.path or not self._dirty:
+            return
+        # 同時保存時共用同一個暫存檔，必須整段序列化，也避免較舊的內容覆蓋較新的檔案
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(self._entries, indent=2, ensure_ascii=False)
+                self._dirty = False
+            try:
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                self._dirty = True
+                print(f"儲存失敗紀錄 {self.path} 時發生錯誤: {e}")
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+_STOP = object()
+
+
+class PricePrefetcher:
+    """背景查價：爬取過程中陸續送入 symbol，湊滿一批或等待逾時後立即送出查價"""
+
+    def __init__(self, fetch_batch: Callable[[List[str]], Dict[str, float]], batch_size: int = 50, linger: float = 2.0):
+        self.fetch_batch = fetch_batch
+        self.batch_size = max(1, batch_size)
+        self.linger = max(0.0, linger)
+        self.results: Dict[str, float] = {}
+        self.batch_count = 0
+        self._queue = queue.Queue()
+        self._seen = set()
+        self._failed: List[str] = []
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """啟動背景查價執行緒"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='price-prefetcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, symbols: Iterable[str]):
+        """送入要查價的 symbol，重複的 symbol 只會查詢一次"""
+        for symbol in symbols:
+            if not symbol or not symbol.strip():
+                continue
+            symbol = symbol.strip()
+            with self._lock:
+                if symbol in self._seen:
+                    continue
+                self._seen.add(symbol)
+            self._queue.put(symbol)
+
+    def finish(self, timeout: float = None) -> Dict[str, float]:
+        """送出剩餘的 symbol 並等待所有查價完成，回傳 symbol -> 價格
+
+        背景查價失敗的批次會在這裡同步重試一次。
+        """
+        if self._thread is None:
+            self.start()
+        self.stop()
+        self._thread.join(timeout)
+        with self._lock:
+            failed, self._failed = self._failed, []
+        if failed:
+            print(f"背景查價失敗的 {len(failed)} 個幣種，重新查詢")
+            self._flush(failed)
+        with self._lock:
+            return dict(self.results)
+
+    def stop(self):
+        """通知背景執行緒送出剩餘的 symbol 後結束，不等待完成（可重複呼叫）"""
+        with self._lock:
+            if self._stopped or self._thread is None:
+                return
+            self._stopped = True
+        self._queue.put(_STOP)
+
+    def _flush(self, pending: List[str]):
+        if not pending:
+            return
+        print(f"背景查價: 送出 {len(pending)} 個幣種")
+        try:
+            prices = self.fetch_batch(list(pending))
+        except Exception as e:
+            print(f"背景查價時發生錯誤: {e}")
+            prices = {}
+            with self._lock:
+                self._failed.extend(pending)
+        with self._lock:
+            self.results.update(prices)
+            self.batch_count += 1
+        pending.clear()
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            # 有待查的 symbol 時最多等到 linger 逾時，否則持續等待新的 symbol
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush(pending)
+                deadline = None
+                continue
+
+            if item is _STOP:
+                self._flush(pending)
+                return
+
+            pending.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.linger
+            if len(pending) >= self.batch_size:
+                self._flush(pending)
+                deadline = None
@@ -0,0 +1,268 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from http_client import PooledHttpSession
+from ttl_cache import TTLCache
+
+
+class PriceProvider(ABC):
+    """價格來源介面：get_prices 回傳 {symbol: USD 價格}，查不到的 symbol 不放入結果"""
+
+    name = 'provider'
+
+    @abstractmethod
+    def get_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """查詢多個幣種的 USD 價格"""
+
+    def close(self):
+        """釋放來源自己建立的連線"""
+
+
+class CoinGeckoProvider(PriceProvider):
+    """以 CoinGecko 批次查價（fetch_batch 通常為 CoinGeckoPriceFetcherWrapper 的批次查詢）"""
+
+    name = 'coingecko'
+
+    def __init__(self, fetch_batch: Callable[[List[str]], Dict[str, float]]):
+        self.fetch_batch = fetch_batch
+
+    def get_prices(self, symbols: List[str]) -> Dict[str, float]:
+        return self.fetch_batch(symbols)
+
+
+class LighterPriceProvider(PriceProvider):
+    """以 Lighter 交易所的 orderBookDetails 取得各市場最新成交價
+
+    一次請求即可取得所有市場，結果依 cache_ttl 快取；base_url 可指向本地測試伺服器。
+    """
+
+    name = 'lighter'
+
+    def __init__(self, base_url: str = 'https://mainnet.zklighter.elliot.ai', session: Optional[PooledHttpSession] = None,
+                 cache_ttl: float = 10):
+        self.base_url = base_url.rstrip('/')
+        self.session = session or PooledHttpSession(headers={'Accept': 'application/json'}, timeout=10, pool_maxsize=2)
+        self._table = TTLCache(ttl_seconds=cache_ttl, max_entries=1)
+
+    def _load_table(self) -> Dict[str, float]:
+        table = self._table.get('markets')
+        if table is not None:
+            return table
+        response = self.session.get(f"{self.base_url}/api/v1/orderBookDetails")
+        response.raise_for_status()
+        table = {}
+        for market in response.json().get('order_book_details', []):
+            symbol = str(market.get('symbol', '')).upper()
+            price = market.get('last_trade_price')
+            try:
+                price = float(price)
+            except (TypeError, ValueError):
+                continue
+            if symbol and price > 0:
+                table[symbol] = price
+        self._table.set('markets', table)
+        return table
+
+    def get_prices(self, symbols: List[str]) -> Dict[str, float]:
+        table = self._load_table()
+        return {symbol: table[symbol] for symbol in symbols if symbol in table}
+
+    def close(self):
+        self.session.close()
+
+
+class ProviderStats:
+    """單一價格來源的延遲與命中統計"""
+
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.hits = 0      # 查到價格的 symbol 數
+        self.misses = 0    # 查不到價格的 symbol 數
+        self.errors = 0
+        self.wins = 0      # 最先提供價格的次數
+        self.hedged = 0    # 因為太慢而啟動備援的次數
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, requested: int, priced: int, error: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.latencies.append(latency)
+            if error:
+                self.errors += 1
+            self.hits += priced
+            self.misses += requested - priced
+
+    def record_hedged(self):
+        with self._lock:
+            self.hedged += 1
+
+    def record_win(self):
+        with self._lock:
+            self.wins += 1
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self.latencies)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """最近延遲的第 p 百分位數（0~1），沒有紀錄時回傳 None"""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+        return samples[index]
+
+    def summary(self) -> Dict[str, float]:
+        p50 = self.percentile(0.5)
+        p90 = self.percentile(0.9)
+        return {
+            'calls': self.calls,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'wins': self.wins,
+            'hedged': self.hedged,
+            'p50': round(p50, 3) if p50 is not None else None,
+            'p90': round(p90, 3) if p90 is not None else None,
+        }
+
+
+# 各來源的延遲統計在整個程式執行期間共用，每次執行重建的 resolver 也能沿用之前的紀錄
+_PROCESS_STATS: Dict[str, ProviderStats] = {}
+_PROCESS_STATS_LOCK = threading.Lock()
+
+
+def shared_provider_stats(name: str) -> ProviderStats:
+    """取得此程式中該來源共用的統計"""
+    with _PROCESS_STATS_LOCK:
+        if name not in _PROCESS_STATS:
+            _PROCESS_STATS[name] = ProviderStats()
+        return _PROCESS_STATS[name]
+
+
+class HedgedPriceResolver:
+    """依序向多個價格來源查價：前一個來源超過延遲百分位數仍未回應時，同時向下一個來源發出請求
+
+    先回傳的有效價格優先；前一個來源已回應但缺少部分幣種時，立即向下一個來源查詢缺少的部分。
+    未傳入 stats 時使用整個程式共用的延遲統計（shared_provider_stats）。
+    """
+
+    def __init__(self, providers: List[PriceProvider], hedge_percentile: float = 0.9, default_hedge_delay: float = 2.0,
+                 min_hedge_delay: float = 0.2, max_hedge_delay: float = 10.0, timeout: float = 120, min_samples: int = 5,
+                 stats: Optional[Dict[str, ProviderStats]] = None):
+        self.providers = providers
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.timeout = timeout
+        self.min_samples = min_samples
+        if stats is None:
+            stats = {provider.name: shared_provider_stats(provider.name) for provider in providers}
+        else:
+            for provider in providers:
+                stats.setdefault(provider.name, ProviderStats())
+        self.stats = stats
+        self._executor = ThreadPoolExecutor(max_workers=max(2, len(providers) * 2), thread_name_prefix='price-provider')
+
+    def hedge_delay(self, provider: PriceProvider) -> float:
+        """等待此來源多久後啟動備援：依最近延遲的百分位數
+
+        紀錄不足 min_samples 筆時以目前最慢的一筆估計，完全沒有紀錄時使用預設值。
+        """
+        stats = self.stats[provider.name]
+        if stats.sample_count() >= self.min_samples:
+            delay = stats.percentile(self.hedge_percentile)
+        else:
+            delay = stats.percentile(1.0)
+        if delay is None:
+            delay = self.default_hedge_delay
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    def _call(self, provider: PriceProvider, symbols: List[str]) -> Dict[str, float]:
+        started = time.monotonic()
+        try:
+            prices = provider.get_prices(symbols) or {}
+        except Exception as e:
+            self.stats[provider.name].record(time.monotonic() - started, len(symbols), 0, error=True)
+            print(f"價格來源 {provider.name} 查詢失敗: {e}")
+            return {}
+        prices = {symbol: price for symbol, price in prices.items() if symbol in symbols and price is not None}
+        self.stats[provider.name].record(time.monotonic() - started, len(symbols), len(prices))
+        return prices
+
+    def get_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """查詢多個幣種的 USD 價格，回傳 {symbol: price}"""
+        symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol and symbol.strip()))
+        results: Dict[str, float] = {}
+        if not symbols or not self.providers:
+            return results
+
+        deadline = time.monotonic() + self.timeout
+        next_index = 0
+        pending = {}
+        last_launched = None
+
+        def launch():
+            nonlocal next_index, last_launched
+            provider = self.providers[next_index]
+            next_index += 1
+            missing = [symbol for symbol in symbols if symbol not in results]
+            pending[self._executor.submit(self._call, provider, missing)] = provider
+            last_launched = provider
+
+        launch()
+        while len(results) < len(symbols):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"價格查詢逾時，仍缺少 {len(symbols) - len(results)} 個幣種")
+                break
+            if not pending:
+                if next_index >= len(self.providers):
+                    break
+                launch()
+                continue
+
+            has_backup = next_index < len(self.providers)
+            wait_time = min(remaining, self.hedge_delay(last_launched)) if has_backup else remaining
+            done, _ = wait(list(pending), timeout=wait_time, return_when=FIRST_COMPLETED)
+            if not done:
+                # 目前的來源比平常慢，同時向下一個來源查詢
+                if has_backup:
+                    self.stats[last_launched.name].record_hedged()
+                    print(f"價格來源 {last_launched.name} 回應過慢，同時查詢 {self.providers[next_index].name}")
+                    launch()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                contributed = False
+                for symbol, price in future.result().items():
+                    if symbol not in results:
+                        results[symbol] = price
+                        contributed = True
+                if contributed:
+                    self.stats[provider.name].record_win()
+
+        # 未完成的請求留在背景執行，結果僅計入統計
+        return results
+
+    def format_stats(self) -> str:
+        """將各來源的統計整理成可讀的文字"""
+        lines = []
+        for name, stats in self.stats.items():
+            summary = stats.summary()
+            lines.append(f"  {name}: 呼叫 {summary['calls']} 次，命中 {summary['hits']}，未命中 {summary['misses']}，"
+                         f"錯誤 {summary['errors']}，最先回應 {summary['wins']} 次，啟動備援 {summary['hedged']} 次，"
+                         f"延遲 p50={summary['p50']}s p90={summary['p90']}s")
+        return '價格來源統計:\n' + '\n'.join(lines)
+
+    def close(self):
+        """關閉執行緒池"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from http_client import PooledHttpSession
+
+
+class StreamingPriceTable:
+    """記憶體中的 symbol -> (價格, 更新時間) 表
+
+    寫入時複製整個 dict 後替換參照（copy-on-write），讀取時直接取用目前的參照，
+    讀取端不需要取得任何鎖。
+    """
+
+    def __init__(self):
+        self._prices: Dict[str, Tuple[float, float]] = {}
+        self._write_lock = threading.Lock()
+
+    def update(self, prices: Dict[str, float], timestamp: Optional[float] = None):
+        """一次寫入多個價格"""
+        if not prices:
+            return
+        timestamp = timestamp or time.time()
+        with self._write_lock:
+            table = dict(self._prices)
+            for symbol, price in prices.items():
+                table[symbol.upper()] = (price, timestamp)
+            self._prices = table
+
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        """取得價格，超過 max_age 秒未更新時視為沒有價格"""
+        entry = self._prices.get(symbol.upper())
+        if entry is None or (max_age is not None and time.time() - entry[1] > max_age):
+            return None
+        return entry[0]
+
+    def snapshot(self, symbols: Iterable[str], max_age: Optional[float] = None) -> Dict[str, float]:
+        """取得多個 symbol 的價格，只包含未過期的項目"""
+        table = self._prices
+        now = time.time()
+        prices = {}
+        for symbol in symbols:
+            entry = table.get(symbol.upper())
+            if entry is not None and (max_age is None or now - entry[1] <= max_age):
+                prices[symbol] = entry[0]
+        return prices
+
+    def __len__(self):
+        return len(self._prices)
+
+
+class LighterPriceStream:
+    """訂閱 Lighter 的 market_stats WebSocket，持續更新 StreamingPriceTable
+
+    在背景執行緒中執行，斷線時以指數退避重新連線。需要安裝 websocket-client。
+    url 與 api_base_url 可指向本地測試伺服器。
+    """
+
+    def __init__(self, url: str = 'wss://mainnet.zklighter.elliot.ai/stream',
+                 api_base_url: str = 'https://mainnet.zklighter.elliot.ai', table: Optional[StreamingPriceTable] = None,
+                 session: Optional[PooledHttpSession] = None, max_reconnect_delay: float = 60):
+        self.url = url
+        self.api_base_url = api_base_url.rstrip('/')
+        self.table = table or StreamingPriceTable()
+        self.session = session
+        self.max_reconnect_delay = max_reconnect_delay
+        self.market_symbols: Dict[str, str] = {}  # market_id -> symbol
+        self.connected = False
+        self.messages = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ws = None
+
+    def load_market_symbols(self):
+        """從 orderBookDetails 取得 market_id 與 symbol 的對照（訊息中沒有 symbol 時使用）"""
+        session = self.session or PooledHttpSession(headers={'Accept': 'application/json'}, timeout=10, pool_maxsize=1)
+        try:
+            response = session.get(f"{self.api_base_url}/api/v1/orderBookDetails")
+            response.raise_for_status()
+            for market in response.json().get('order_book_details', []):
+                if market.get('symbol') is not None and market.get('market_id') is not None:
+                    self.market_symbols[str(market['market_id'])] = str(market['symbol']).upper()
+            print(f"已載入 {len(self.market_symbols)} 個 Lighter 市場")
+        except Exception as e:
+            print(f"載入 Lighter 市場清單時發生錯誤: {e}")
+
+    def handle_message(self, text: str) -> Optional[Dict]:
+        """解析一則 WebSocket 訊息並更新價格表，回傳解析後的訊息"""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(message, dict):
+            return None
+        stats = message.get('market_stats')
+        if not isinstance(stats, dict):
+            return message
+        # 訂閱單一市場時 market_stats 就是該市場的資料
+        entries = [stats] if 'market_id' in stats else list(stats.values())
+        prices = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            symbol = entry.get('symbol') or self.market_symbols.get(str(entry.get('market_id')))
+            price = entry.get('mark_price') or entry.get('last_trade_price')
+            try:
+                price = float(price)
+            except (TypeError, ValueError):
+                continue
+            if symbol and price > 0:
+                prices[str(symbol).upper()] = price
+        self.table.update(prices)
+        self.messages += 1
+        return message
+
+    def start(self) -> 'LighterPriceStream':
+        """啟動背景執行緒"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='lighter-price-stream', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止訂閱並關閉連線"""
+        self._stop.set()
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        try:
+            import websocket
+        except ImportError:
+            print("未安裝 websocket-client，無法啟用即時價格（pip install websocket-client）")
+            return
+
+        if not self.market_symbols:
+            self.load_market_symbols()
+
+        delay = 1.0
+        while not self._stop.is_set():
+            try:
+                self._ws = websocket.create_connection(self.url, timeout=30)
+                self._ws.send(json.dumps({'type': 'subscribe', 'channel': 'market_stats/all'}))
+                self.connected = True
+                delay = 1.0
+                print(f"已連線即時價格: {self.url}")
+                while not self._stop.is_set():
+                    text = self._ws.recv()
+                    if not text:
+                        break
+                    message = self.handle_message(text)
+                    if message and message.get('type') == 'ping':
+                        self._ws.send(json.dumps({'type': 'pong'}))
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"即時價格連線中斷: {e}，{delay:.0f} 秒後重新連線")
+            finally:
+                self.connected = False
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except Exception:
+                        pass
+                    self._ws = None
+            if self._stop.wait(delay):
+                break
+            delay = min(self.max_reconnect_delay, delay * 2)
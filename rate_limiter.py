@@ -0,0 +1,88 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+class RateLimiter:
+    """權杖桶限流器：依每分鐘呼叫次數控制請求速度，遇到 429 時依 Retry-After 或指數退避暫停
+
+    收到 429 時會暫時降低速率，之後每次成功的請求再逐步恢復到設定值，
+    讓實際速率維持在伺服器限制之下，而不是在爆量與長時間停頓之間擺盪。
+    同一個限流器可由多個執行緒共用。
+    """
+
+    def __init__(self, calls_per_minute: float = 30, burst: Optional[int] = None, max_backoff: float = 120,
+                 jitter: float = 0.25):
+        self.calls_per_minute = calls_per_minute
+        self.burst = burst or max(1, int(calls_per_minute // 6))
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._rate = calls_per_minute / 60.0  # 目前每秒可用的權杖數
+        self._min_rate = self._rate * 0.25
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._consecutive_limited = 0
+        self._lock = threading.Lock()
+
+    @property
+    def current_calls_per_minute(self) -> float:
+        return self._rate * 60
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def acquire(self):
+        """取得一個請求名額，必要時等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait_time = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait_time = (1 - self._tokens) / self._rate
+            time.sleep(wait_time)
+
+    def on_success(self):
+        """請求成功，逐步恢復速率"""
+        with self._lock:
+            self._consecutive_limited = 0
+            self._rate = min(self.calls_per_minute / 60.0, self._rate * 1.05)
+
+    def on_rate_limited(self, retry_after: Optional[str] = None) -> float:
+        """收到 429，暫停所有請求並降低速率，回傳暫停秒數"""
+        delay = self.parse_retry_after(retry_after)
+        with self._lock:
+            self._consecutive_limited += 1
+            if delay is None:
+                delay = min(self.max_backoff, 5 * (2 ** (self._consecutive_limited - 1)))
+            delay += random.uniform(0, delay * self.jitter)
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + delay)
+            self._rate = max(self._min_rate, self._rate * 0.75)
+            self._tokens = 0.0
+            self._updated_at = now
+        return delay
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """解析 Retry-After 標頭（秒數或 HTTP 日期），無法解析時回傳 None"""
+        if not value:
+            return None
+        value = str(value).strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
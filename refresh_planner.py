@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sheet_io import SheetSnapshot
+
+LAST_UPDATED_FORMAT = '%Y/%m/%d %H:%M:%S'
+
+# 試算表依地區設定顯示的其他日期格式（USER_ENTERED 寫入後讀回的是顯示格式）
+_LAST_UPDATED_FORMATS = (
+    LAST_UPDATED_FORMAT,
+    '%Y/%m/%d %H:%M',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y/%m/%d %p %I:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %I:%M:%S %p',
+    '%d/%m/%Y %H:%M:%S',
+    '%d.%m.%Y %H:%M:%S',
+    '%Y/%m/%d',
+    '%Y-%m-%d',
+)
+# Google 試算表日期序號的起點
+_SHEETS_EPOCH = datetime(1899, 12, 30)
+
+
+def parse_last_updated(value) -> Optional[datetime]:
+    """解析 last_updated 欄位（多種顯示格式或試算表日期序號），無法解析時回傳 None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return _SHEETS_EPOCH + timedelta(days=float(value))
+    text = str(value).strip().replace('上午', 'AM').replace('下午', 'PM')
+    for date_format in _LAST_UPDATED_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    try:
+        serial = float(text)
+    except ValueError:
+        return None
+    # 合理範圍內的數字視為日期序號（約 1982 年到 2118 年）
+    if 30000 < serial < 80000:
+        return _SHEETS_EPOCH + timedelta(days=serial)
+    return None
+
+
+class UrlStateStore:
+    """記錄每一行上次爬取時的網址與時間，用來找出網址變更過的行
+
+    爬取時間在 last_updated 欄位無法解析時（例如試算表地區設定不同）作為替代。
+    """
+
+    def __init__(self, path: Optional[str] = 'row_url_state.json'):
+        self.path = path
+        self._urls: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def get(self, row: int) -> Optional[str]:
+        entry = self._urls.get(str(row))
+        return entry.get('url') if entry else None
+
+    def get_scraped_at(self, row: int) -> Optional[datetime]:
+        """該行上次爬取的時間，沒有紀錄時回傳 None"""
+        entry = self._urls.get(str(row))
+        if not entry or not entry.get('scraped_at'):
+            return None
+        return datetime.fromtimestamp(entry['scraped_at'])
+
+    def update(self, rows: Dict[int, str]):
+        """記錄這些行本次爬取的網址與時間"""
+        now = time.time()
+        with self._lock:
+            for row, url in rows.items():
+                self._urls[str(row)] = {'url': url, 'scraped_at': now}
+                self._dirty = True
+
+    def load(self):
+        """從磁碟載入網址紀錄"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 舊格式只記錄網址（row -> url）
+            self._urls = {row: entry if isinstance(entry, dict) else {'url': entry}
+                          for row, entry in data.items()}
+        except Exception as e:
+            print(f"載入網址紀錄 {self.path} 時發生錯誤: {e}")
+
+    def save(self):
+        """將網址紀錄保存到磁碟（有變動時才寫入）"""
+        if not self.path or not self._dirty:
+            return
+        # 同時保存時共用同一個暫存檔，必須整段序列化，也避免較舊的內容覆蓋較新的檔案
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(self._urls, indent=2, ensure_ascii=False)
+                self._dirty = False
+            try:
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                self._dirty = True
+                print(f"儲存網址紀錄 {self.path} 時發生錯誤: {e}")
+
+
+def plan_incremental_rows(snapshot: SheetSnapshot, url_state: UrlStateStore, last_updated_col: int,
+                          max_age_seconds: float, budget: Optional[int] = None,
+                          now: Optional[datetime] = None) -> List[int]:
+    """挑出本次需要重新爬取的行（0-based，相對於 start_row），依優先順序排列
+
+    優先順序：
+      1. 新的行（沒有 last_updated 或從未記錄網址）
+      2. 網址與上次爬取時不同的行
+      3. last_updated 超過 max_age_seconds 的行，越舊越優先
+    budget 為本次最多處理的行數，None 表示不限制。
+    """
+    now = now or datetime.now()
+    new_rows, changed_rows, stale_rows = [], [], []
+    unparsed_count = 0
+    unparsed_example = None
+    for i, url_row in enumerate(snapshot.url_rows):
+        url = url_row[0] if url_row else ''
+        if not url:
+            continue
+        row = snapshot.start_row + i
+        cell = snapshot.get_cell(row, last_updated_col)
+        last_updated = parse_last_updated(cell)
+        if last_updated is None and cell:
+            # 無法解析的日期改用上次爬取的時間，避免每次都把同一批行當成新的行
+            unparsed_count += 1
+            unparsed_example = unparsed_example or cell
+            last_updated = url_state.get_scraped_at(row)
+        previous_url = url_state.get(row)
+        if last_updated is None or previous_url is None:
+            new_rows.append(i)
+        elif previous_url != url:
+            changed_rows.append(i)
+        else:
+            age = (now - last_updated).total_seconds()
+            if age >= max_age_seconds:
+                stale_rows.append((-age, i))
+
+    if unparsed_count:
+        print(f"警告: {unparsed_count} 行的 last_updated 無法解析（例如 '{unparsed_example}'），改用上次爬取的時間")
+
+    selected = new_rows + changed_rows + [i for _, i in sorted(stale_rows)]
+    if budget is not None and len(selected) > budget:
+        print(f"本次需更新 {len(selected)} 行，超過上限 {budget} 行，其餘留待下次")
+        selected = selected[:budget]
+    print(f"增量更新: 新增 {len(new_rows)} 行，網址變更 {len(changed_rows)} 行，過期 {len(stale_rows)} 行，"
+          f"本次處理 {len(selected)} 行")
+    return selected
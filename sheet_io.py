@@ -0,0 +1,253 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+# 讀寫的分頁名稱
+SHEET_NAME = '交易'
+
+# 單次 values.batchUpdate 請求的內容大小上限（位元組）
+DEFAULT_MAX_PAYLOAD_BYTES = 1_000_000
+
+_CELL_PATTERN = re.compile(r'^([A-Z]+)(\d+)$')
+
+
+def column_letter(col_idx: int) -> str:
+    """將 0-based 欄位索引轉換成欄位字母（0 -> A，26 -> AA）"""
+    letters = ''
+    col_idx += 1
+    while col_idx > 0:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def column_index(letters: str) -> int:
+    """將欄位字母轉換成 0-based 欄位索引（A -> 0，AA -> 26）"""
+    col_idx = 0
+    for char in letters.upper():
+        col_idx = col_idx * 26 + (ord(char) - 64)
+    return col_idx - 1
+
+
+def parse_cell(cell: str) -> Tuple[int, int]:
+    """解析 A1 格式的儲存格位置，回傳 (行號, 0-based 欄位索引)"""
+    match = _CELL_PATTERN.match(cell.strip().upper())
+    if not match:
+        raise ValueError(f"無法解析儲存格位置: {cell}")
+    return int(match.group(2)), column_index(match.group(1))
+
+
+def coalesce_cell_updates(cell_updates: List[Tuple[str, object]], sheet_name: str = SHEET_NAME) -> List[Dict]:
+    """將單一儲存格的更新合併成連續的矩形範圍
+
+    只合併實際要更新的儲存格，不會為了湊成矩形而寫入中間未指定的欄位。
+    同一儲存格出現多次時以最後一次的值為準。
+    """
+    cells_by_row: Dict[int, Dict[int, object]] = {}
+    for cell, value in cell_updates:
+        row, col = parse_cell(cell)
+        cells_by_row.setdefault(row, {})[col] = value
+
+    # 先將每一行切成連續欄位的區段，再把欄位範圍相同的相鄰行合併
+    rectangles = []
+    open_rectangles: Dict[Tuple[int, int], Dict] = {}
+    for row in sorted(cells_by_row):
+        row_cells = cells_by_row[row]
+        columns = sorted(row_cells)
+        runs = []
+        run_start = columns[0]
+        previous = columns[0]
+        for col in columns[1:]:
+            if col != previous + 1:
+                runs.append((run_start, previous))
+                run_start = col
+            previous = col
+        runs.append((run_start, previous))
+
+        for start_col, end_col in runs:
+            values = [row_cells[col] for col in range(start_col, end_col + 1)]
+            span = (start_col, end_col)
+            rectangle = open_rectangles.get(span)
+            if rectangle and rectangle['end_row'] == row - 1:
+                rectangle['end_row'] = row
+                rectangle['values'].append(values)
+            else:
+                rectangle = {
+                    'start_row': row,
+                    'end_row': row,
+                    'start_col': start_col,
+                    'end_col': end_col,
+                    'values': [values],
+                }
+                open_rectangles[span] = rectangle
+                rectangles.append(rectangle)
+
+    value_ranges = []
+    for rectangle in sorted(rectangles, key=lambda r: (r['start_row'], r['start_col'])):
+        start = f"{column_letter(rectangle['start_col'])}{rectangle['start_row']}"
+        end = f"{column_letter(rectangle['end_col'])}{rectangle['end_row']}"
+        range_name = start if start == end else f"{start}:{end}"
+        value_ranges.append({
+            'range': f"{sheet_name}!{range_name}",
+            'values': rectangle['values'],
+        })
+    return value_ranges
+
+
+def _payload_size(value_range: Dict) -> int:
+    return len(json.dumps(value_range, ensure_ascii=False).encode('utf-8'))
+
+
+def pack_value_ranges(value_ranges: List[Dict], max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES) -> List[List[Dict]]:
+    """依請求大小上限，把範圍盡量塞進同一個 batchUpdate 請求
+
+    單一範圍超過上限時仍會獨立成一個請求，交由 API 判斷是否接受。
+    """
+    batches = []
+    current_batch = []
+    current_size = 0
+    for value_range in value_ranges:
+        size = _payload_size(value_range) + 1  # 加上分隔逗號
+        if current_batch and current_size + size > max_payload_bytes:
+            batches.append(current_batch)
+            current_batch = []
+            current_size = 0
+        current_batch.append(value_range)
+        current_size += size
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+
+def _normalize_number(value: str):
+    cleaned = value.replace(',', '').replace('$', '').replace('＄', '').strip()
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def values_equal(old_value, new_value) -> bool:
+    """比較試算表現有值與新值是否相同（數字依數值比較，忽略千分位與 $ 格式差異）"""
+    old_text = '' if old_value is None else str(old_value).strip()
+    new_text = '' if new_value is None else str(new_value).strip()
+    if old_text == new_text:
+        return True
+    if not old_text or not new_text:
+        return False
+    old_number = _normalize_number(old_text)
+    new_number = _normalize_number(new_text)
+    if old_number is None or new_number is None:
+        return False
+    return old_number == new_number
+
+
+def diff_cell_updates(cell_updates: List[Tuple[str, object]], snapshot_rows: List[List], start_row: int,
+                      always_touch_columns=()) -> List[Tuple[str, object]]:
+    """與記憶體中的試算表快照比較，只保留值有變動的儲存格
+
+    snapshot_rows 為從 start_row 開始、A 欄起算的資料區塊；
+    always_touch_columns 內的欄位（0-based）不論是否變動都會寫入。
+    """
+    always_touch = set(always_touch_columns)
+    changed = []
+    for cell, value in cell_updates:
+        row, col = parse_cell(cell)
+        if col in always_touch:
+            changed.append((cell, value))
+            continue
+        row_idx = row - start_row
+        current = ''
+        if 0 <= row_idx < len(snapshot_rows) and col < len(snapshot_rows[row_idx]):
+            current = snapshot_rows[row_idx][col]
+        if not values_equal(current, value):
+            changed.append((cell, value))
+    return changed
+
+
+def skip_pending_price_cells(cell_updates: List[Tuple[str, object]], snapshot_rows: List[List], start_row: int,
+                             price_symbol_columns: Dict[int, int]) -> List[Tuple[str, object]]:
+    """移除 symbol 沒有變動的行的價格儲存格
+
+    price_symbol_columns 為 {價格欄位: 對應的 symbol 欄位}（0-based）。爬取步驟沒有價格，
+    symbol 不變時價格留給查價步驟寫入，避免先清空再填回；symbol 變動時仍清空舊價格。
+    """
+    new_values = {parse_cell(cell): value for cell, value in cell_updates}
+    kept = []
+    for cell, value in cell_updates:
+        row, col = parse_cell(cell)
+        symbol_col = price_symbol_columns.get(col)
+        if symbol_col is not None:
+            row_idx = row - start_row
+            current = ''
+            if 0 <= row_idx < len(snapshot_rows) and symbol_col < len(snapshot_rows[row_idx]):
+                current = snapshot_rows[row_idx][symbol_col]
+            if values_equal(current, new_values.get((row, symbol_col), current)):
+                continue
+        kept.append((cell, value))
+    return kept
+
+
+class SheetSnapshot:
+    """試算表快照：一次 batchGet 讀取表頭、網址欄位與資料區塊，供步驟 1 與步驟 2 共用"""
+
+    def __init__(self, header_row: List, url_rows: List[List], data_rows: List[List],
+                 url_column: str, start_row: int, end_row=None):
+        self.header_row = header_row
+        self.url_rows = url_rows
+        self.data_rows = data_rows
+        self.url_column = url_column
+        self.start_row = start_row
+        self.end_row = end_row
+
+    @classmethod
+    def load(cls, service, spreadsheet_id: str, url_column: str, start_row: int, end_row=None,
+             sheet_name: str = SHEET_NAME):
+        """以單一 values.batchGet 請求載入快照，失敗時回傳 None"""
+        end = end_row if end_row else ''
+        ranges = [
+            f"{sheet_name}!1:1",
+            f"{sheet_name}!{url_column}{start_row}:{url_column}{end}",
+            f"{sheet_name}!A{start_row}:Z{end}",
+        ]
+        try:
+            result = service.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=ranges
+            ).execute()
+        except Exception as e:
+            print(f"讀取試算表快照時發生錯誤: {e}")
+            return None
+
+        value_ranges = result.get('valueRanges', [])
+        values = [value_ranges[i].get('values', []) if i < len(value_ranges) else [] for i in range(len(ranges))]
+        header_rows, url_rows, data_rows = values
+        header_row = header_rows[0] if header_rows else []
+        print(f"已載入試算表快照: 表頭 {len(header_row)} 欄，資料 {len(data_rows)} 行")
+        return cls(header_row, url_rows, data_rows, url_column, start_row, end_row)
+
+    def get_cell(self, row: int, col: int) -> str:
+        """取得快照中某個儲存格的值（行號為試算表行號，欄位為 0-based）"""
+        row_idx = row - self.start_row
+        if 0 <= row_idx < len(self.data_rows) and col < len(self.data_rows[row_idx]):
+            return self.data_rows[row_idx][col]
+        return ''
+
+    def apply_updates(self, cell_updates: List[Tuple[str, object]]):
+        """將已寫入的儲存格同步到快照中，讓後續步驟不必重新讀取"""
+        url_col = column_index(self.url_column)
+        for cell, value in cell_updates:
+            row, col = parse_cell(cell)
+            row_idx = row - self.start_row
+            if row_idx < 0:
+                continue
+            while len(self.data_rows) <= row_idx:
+                self.data_rows.append([])
+            row_values = self.data_rows[row_idx]
+            if len(row_values) <= col:
+                row_values.extend([''] * (col + 1 - len(row_values)))
+            row_values[col] = value
+            if col == url_col:
+                while len(self.url_rows) <= row_idx:
+                    self.url_rows.append([])
+                self.url_rows[row_idx] = [value]
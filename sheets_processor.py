@@ -1,9 +1,9 @@
+import codecs
 import os
 import re
 import time
 import requests
-from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse, parse_qs
 import pandas as pd
 from google.oauth2.credentials import Credentials
@@ -13,14 +13,85 @@ from googleapiclient.discovery import build
 import pickle
 import asyncio
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 import config
 
-from coingecko_price_fetcher import CoinGeckoPriceFetcher
+from account_parser import IncrementalAccountParser, clean_monetary_value, parse_account_page
+from account_sources import AccountDataSource, HtmlScraperSource, LighterApiSource
+from async_coingecko import AsyncCoinGeckoPriceFetcher
+from coingecko_price_fetcher import CoinGeckoPriceFetcher, MarketData
+from coin_index import CoinListIndex
+from coin_mapping_store import CoinMappingStore
+from negative_cache import NegativeCache
+from rate_limiter import RateLimiter
+from http_client import PooledHttpSession
+from price_prefetcher import PricePrefetcher
+from price_providers import CoinGeckoProvider, HedgedPriceResolver, LighterPriceProvider
+from price_stream import LighterPriceStream
+from refresh_planner import UrlStateStore, plan_incremental_rows
+from ttl_cache import TTLCache
+from sheet_io import (DEFAULT_MAX_PAYLOAD_BYTES, SheetSnapshot, coalesce_cell_updates, diff_cell_updates, pack_value_ranges,
+                      skip_pending_price_cells)
 
 class CoinGeckoPriceFetcherWrapper:
     def __init__(self):
-        self.coingecko_fetcher = CoinGeckoPriceFetcher()
+        # 價格快取保存到磁碟，每小時重建的 wrapper 也能沿用上次的查詢結果
+        price_cache = TTLCache(
+            ttl_seconds=getattr(config, 'PRICE_CACHE_TTL', 300),
+            max_entries=getattr(config, 'PRICE_CACHE_MAX_ENTRIES', 2000),
+            path=getattr(config, 'PRICE_CACHE_FILE', 'price_cache.json'),
+        )
+        market_cache = TTLCache(
+            ttl_seconds=getattr(config, 'MARKET_DATA_CACHE_TTL', 300),
+            max_entries=getattr(config, 'PRICE_CACHE_MAX_ENTRIES', 2000),
+            path=getattr(config, 'MARKET_DATA_CACHE_FILE', None),
+        )
+        coin_index = CoinListIndex(
+            path=getattr(config, 'COIN_INDEX_FILE', 'coin_list_index.json'),
+            refresh_hours=getattr(config, 'COIN_INDEX_REFRESH_HOURS', 24),
+            rank_pages=getattr(config, 'COIN_INDEX_RANK_PAGES', 4),
+        )
+        negative_cache = NegativeCache(
+            path=getattr(config, 'NEGATIVE_CACHE_FILE', 'coin_negative_cache.json'),
+            base_interval=getattr(config, 'NEGATIVE_CACHE_BASE_INTERVAL', 3600),
+            max_interval=getattr(config, 'NEGATIVE_CACHE_MAX_INTERVAL', 7 * 24 * 3600),
+        )
+        mapping_store = CoinMappingStore(
+            path=getattr(config, 'COIN_MAPPING_FILE', 'coin_mapping.json'),
+            compact_threshold=getattr(config, 'COIN_MAPPING_COMPACT_THRESHOLD', 200),
+        )
+        rate_limiter = RateLimiter(calls_per_minute=getattr(config, 'COINGECKO_CALLS_PER_MINUTE', 30))
+        self.coingecko_fetcher = CoinGeckoPriceFetcher(price_cache=price_cache, coin_index=coin_index,
+                                                       negative_cache=negative_cache, mapping_store=mapping_store,
+                                                       rate_limiter=rate_limiter,
+                                                       max_url_length=getattr(config, 'COINGECKO_MAX_URL_LENGTH', 2000),
+                                                       market_cache=market_cache)
+        # 各批次、搜尋請求同時送出，仍共用同一個限流器
+        self.async_fetcher = AsyncCoinGeckoPriceFetcher(
+            self.coingecko_fetcher,
+            max_concurrency=getattr(config, 'COINGECKO_MAX_CONCURRENCY', 4),
+        )
+        # 多個價格來源：主要來源過慢時同時查詢下一個來源，採用最先回傳的價格
+        providers = []
+        for name in getattr(config, 'PRICE_PROVIDERS', ['coingecko']):
+            if name == 'coingecko':
+                providers.append(CoinGeckoProvider(self.async_fetcher.get_batch_prices_sync))
+            elif name == 'lighter':
+                providers.append(LighterPriceProvider(
+                    base_url=getattr(config, 'LIGHTER_API_BASE_URL', 'https://mainnet.zklighter.elliot.ai'),
+                ))
+            else:
+                print(f"未知的價格來源: {name}")
+        if not providers:
+            print("PRICE_PROVIDERS 沒有可用的價格來源，改用 CoinGecko")
+            providers.append(CoinGeckoProvider(self.async_fetcher.get_batch_prices_sync))
+        self.price_resolver = HedgedPriceResolver(
+            providers,
+            hedge_percentile=getattr(config, 'PRICE_HEDGE_PERCENTILE', 0.9),
+            default_hedge_delay=getattr(config, 'PRICE_HEDGE_DEFAULT_DELAY', 2.0),
+        )
         
     def get_current_price_rest(self, symbol: str) -> Optional[float]:
         """使用 CoinGecko API 獲取當前價格"""
@@ -28,26 +99,123 @@ class CoinGeckoPriceFetcherWrapper:
 
     def get_prices_for_symbols(self, symbols: List[str]) -> Dict[str, float]:
         """為多個幣種獲取價格（使用批次查詢）"""
-        return self.coingecko_fetcher.get_batch_prices_with_delay(symbols, delay=3.0)
+        # 只有 CoinGecko 一個來源時直接查詢，不經過備援流程
+        providers = self.price_resolver.providers
+        if len(providers) == 1 and isinstance(providers[0], CoinGeckoProvider):
+            # 請求速率由限流器控制，各批次同時送出，總時間約等於最慢的一批
+            return self.async_fetcher.get_batch_prices_sync(symbols)
+        return self.price_resolver.get_prices(symbols)
+
+    def get_multi_currency_prices(self, symbols: List[str], currencies: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+        """一次查詢多種貨幣的價格，回傳 {symbol: {currency: price}}"""
+        currencies = currencies or getattr(config, 'PRICE_CURRENCIES', ['usd'])
+        return self.async_fetcher.get_multi_currency_prices_sync(symbols, currencies)
+
+    def get_market_data_for_symbols(self, symbols: List[str], currency: str = 'usd') -> Dict[str, MarketData]:
+        """批次取得多個幣種的市值、成交量與 24 小時漲跌"""
+        return self.coingecko_fetcher.get_bulk_market_data(symbols, currency)
+
+    def create_prefetcher(self) -> PricePrefetcher:
+        """建立背景查價器，沿用每批 50 個幣種的批次查詢"""
+        return PricePrefetcher(
+            self.get_prices_for_symbols,
+            batch_size=50,
+            linger=getattr(config, 'PRICE_PREFETCH_LINGER', 2.0),
+        )
+
+    def close(self):
+        """關閉查價用的執行緒池與連線（重建 wrapper 前呼叫）"""
+        self.price_resolver.close()
+        self.async_fetcher.close()
+        for provider in self.price_resolver.providers:
+            provider.close()
+        self.coingecko_fetcher.session.close()
+
+class HostThrottle:
+    """依主機限制同時連線數與請求間隔，避免並行爬取時對同一網站造成壓力"""
+
+    def __init__(self, max_concurrency: int = 4, min_interval: float = 0.25):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_interval = max(0.0, min_interval)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_slot = {}
+
+    def _get_semaphore(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_concurrency)
+            return self._semaphores[host]
+
+    @contextmanager
+    def slot(self, url: str):
+        """取得對某主機發送請求的名額，離開時釋放"""
+        host = urlparse(url).netloc.lower()
+        semaphore = self._get_semaphore(host)
+        with semaphore:
+            # 依序分配發送時間點，確保同一主機的請求間隔至少 min_interval 秒
+            with self._lock:
+                now = time.monotonic()
+                start_at = max(now, self._next_slot.get(host, 0.0))
+                self._next_slot[host] = start_at + self.min_interval
+            wait_time = start_at - time.monotonic()
+            if wait_time > 0:
+                time.sleep(wait_time)
+            yield
+
 
 class SheetsProcessor:
-    def __init__(self):
+    def __init__(self, price_stream: Optional[LighterPriceStream] = None,
+                 account_source: Optional[AccountDataSource] = None):
         self.SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
         self.creds = None
         self.service = None
         self.price_fetcher = CoinGeckoPriceFetcherWrapper()
+        # 即時價格串流（長時間執行時由主程式建立並在每次執行間共用）
+        self.price_stream = price_stream
+        # 各行上次爬取的網址，增量更新時用來找出網址變更的行
+        self.url_state = UrlStateStore(getattr(config, 'URL_STATE_FILE', 'row_url_state.json'))
+        # 並行爬取設定（config.py 未設定時使用預設值）
+        self.scrape_max_workers = getattr(config, 'SCRAPE_MAX_WORKERS', 8)
+        self.host_throttle = HostThrottle(
+            max_concurrency=getattr(config, 'SCRAPE_PER_HOST_CONCURRENCY', 4),
+            min_interval=getattr(config, 'SCRAPE_PER_HOST_DELAY', 0.25),
+        )
+        # 爬取用的共用連線池，每個主機保留足夠的連線給所有並行執行緒
+        self.http_session = PooledHttpSession(
+            headers={
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            },
+            timeout=getattr(config, 'HTTP_TIMEOUT', 15),
+            pool_maxsize=max(self.scrape_max_workers, getattr(config, 'SCRAPE_PER_HOST_CONCURRENCY', 4)),
+        )
+        # 爬取下載的位元組數（串流模式提前停止時只計算實際讀取的部分）
+        self.scrape_bytes = 0
+        self._scrape_bytes_lock = threading.Lock()
+        # 帳戶資料來源：爬取區塊瀏覽器頁面，或直接查詢帳戶 API
+        self.account_source = account_source or self._create_account_source()
+
+    def _create_account_source(self) -> AccountDataSource:
+        """依 config.ACCOUNT_SOURCE 建立帳戶資料來源"""
+        source = getattr(config, 'ACCOUNT_SOURCE', 'html')
+        if source == 'lighter_api':
+            return LighterApiSource(
+                base_url=getattr(config, 'LIGHTER_API_BASE_URL', 'https://mainnet.zklighter.elliot.ai'),
+                max_workers=getattr(config, 'ACCOUNT_API_MAX_WORKERS', 4),
+            )
+        if source != 'html':
+            print(f"未知的帳戶資料來源: {source}，改用網頁爬取")
+        return HtmlScraperSource(self.scrape_urls)
+
+    def close(self):
+        """關閉查價執行緒池與所有連線池"""
+        self.price_fetcher.close()
+        self.account_source.close()
+        self.http_session.close()
 
     def clean_monetary_value(self, value):
         """強力清理金額值，移除$、全形$、非數字、只留數字/小數/負號"""
-        if not value:
-            return value
-        value_str = str(value)
-        value_str = value_str.replace('$', '').replace('＄', '').strip()
-        cleaned = re.sub(r'[^\d\-\.]', '', value_str)
-        if cleaned.count('.') > 1:
-            parts = cleaned.split('.')
-            cleaned = parts[0] + '.' + ''.join(parts[1:])
-        return cleaned
+        return clean_monetary_value(value)
     
     def authenticate(self):
         """Google Sheets API 認證"""
@@ -134,16 +302,158 @@ class SheetsProcessor:
 
 
 
-    def fill_symbols_from_urls(self, spreadsheet_id: str, url_column: str, start_row: int = 2, end_row: Optional[int] = None):
-        """第一步：只根據網址爬取資料，填寫 symbol 等欄位，不處理價格"""
-        # 讀取第二個分頁（交易分頁）的第1行作為標題行
-        header_range = "交易!1:1"
-        headers = self.read_sheet_data(spreadsheet_id, header_range)
-        if not headers or not headers[0]:
+    def load_snapshot(self, spreadsheet_id: str, url_column: str, start_row: int = 2, end_row: Optional[int] = None) -> Optional[SheetSnapshot]:
+        """一次讀取表頭、網址欄位與資料區塊，供步驟 1 與步驟 2 共用"""
+        return SheetSnapshot.load(self.service, spreadsheet_id, url_column, start_row, end_row)
+
+    def start_price_prefetcher(self) -> Optional[PricePrefetcher]:
+        """啟動背景查價，未啟用或使用即時價格時回傳 None"""
+        # 即時價格模式下大部分價格已在記憶體中，不需要背景查價
+        if not getattr(config, 'PRICE_PREFETCH', True) or self.price_stream is not None:
+            return None
+        return self.price_fetcher.create_prefetcher().start()
+    
+    def _prefetch_callback(self, prefetcher: Optional[PricePrefetcher]) -> Optional[Callable[[Dict[str, str]], None]]:
+        """每爬完一頁就把新發現的 symbol 送去背景查價，查價時間與爬取時間重疊"""
+        if prefetcher is None:
+            return None
+        
+        def on_scraped(scraped_info):
+            prefetcher.submit(self._to_price_symbol(scraped_info.get(field, '')) for field in ('symbol1', 'symbol2'))
+        return on_scraped
+
+    def fill_symbols_from_urls(self, spreadsheet_id: str, url_column: str, start_row: int = 2, end_row: Optional[int] = None,
+                               snapshot: Optional[SheetSnapshot] = None, prefetcher: Optional[PricePrefetcher] = None):
+        """第一步：只根據網址爬取資料，填寫 symbol 等欄位，不處理價格
+
+        有傳入 prefetcher 時，爬取的 symbol 會立即送去背景查價，步驟 2 再等待結果。
+        """
+        # 沒有傳入快照時自行讀取（第二個分頁「交易」的表頭、網址欄位與資料區塊）
+        if snapshot is None:
+            snapshot = self.load_snapshot(spreadsheet_id, url_column, start_row, end_row)
+        if snapshot is None or not snapshot.header_row:
+            print("無法讀取表頭")
+            return
+        header_row = snapshot.header_row
+        
+        if not self._validate_column_mappings(header_row):
+            return
+        
+        # 完整的資料範圍與 URL 欄位資料都來自快照
+        all_data = snapshot.data_rows
+        url_data = snapshot.url_rows
+        
+        # 確保我們處理所有行，包括空行
+        total_rows = end_row - start_row + 1 if end_row else len(all_data)
+        print(f"總共需要處理 {total_rows} 行")
+        
+        # 增量更新：只爬取新的、網址變更或已過期的行
+        only_rows = self._select_refresh_rows(snapshot)
+        
+        batch_updates, updated_count = self._build_scrape_updates(url_data, header_row, start_row,
+                                                                  on_scraped=self._prefetch_callback(prefetcher),
+                                                                  only_rows=only_rows)
+        
+        # 價格欄位由步驟 2 寫入：symbol 沒變的行不在這裡清空價格，避免多寫一次且兩個步驟之間價格空白
+        batch_updates = self._skip_pending_price_cells(batch_updates, all_data, start_row)
+        
+        # 與讀取到的資料比較，只寫入有變動的儲存格
+        changed_updates = self._filter_unchanged_cells(batch_updates, all_data, start_row)
+        
+        # 執行批次更新
+        if changed_updates:
+            print(f"\n執行批次更新: {len(changed_updates)} 行，共 {sum(len(row) for row in changed_updates)} 個儲存格")
+            self._batch_update_cells(spreadsheet_id, changed_updates)
+        
+        # 同步更新快照，步驟 2 可直接使用新的 symbol 而不必重新讀取
+        snapshot.apply_updates([cell for row_updates in batch_updates for cell in row_updates])
+        self._record_scraped_urls(url_data, start_row, only_rows)
+        
+        print(f"成功處理 {updated_count} 行 symbol/基本資料填寫")
+    
+    def run_fused_pipeline(self, spreadsheet_id: str, url_column: str, start_row: int = 2, end_row: Optional[int] = None,
+                           snapshot: Optional[SheetSnapshot] = None):
+        """單次流程：爬取資料、批次查價後，將基本資料與價格一次合併寫入"""
+        if snapshot is None:
+            snapshot = self.load_snapshot(spreadsheet_id, url_column, start_row, end_row)
+        if snapshot is None or not snapshot.header_row:
             print("無法讀取表頭")
             return
-        header_row = headers[0]
+        header_row = snapshot.header_row
+        
+        if not self._validate_column_mappings(header_row) or not self._validate_price_columns(header_row):
+            return
+        
+        # 保留原始資料供差異比對，之後的更新都只在記憶體中套用
+        original_rows = [list(row) for row in snapshot.data_rows]
+        
+        # 背景查價：每爬完一頁就把新發現的 symbol 送去查價
+        prefetcher = self.start_price_prefetcher()
+        on_scraped = self._prefetch_callback(prefetcher)
+        
+        try:
+            # 爬取所有網址，結果先套用到快照，讓查價直接使用新的 symbol
+            only_rows = self._select_refresh_rows(snapshot)
+            scrape_updates, scraped_count = self._build_scrape_updates(snapshot.url_rows, header_row, start_row,
+                                                                       on_scraped=on_scraped, only_rows=only_rows)
+            scrape_cells = [cell for row_updates in scrape_updates for cell in row_updates]
+            snapshot.apply_updates(scrape_cells)
+        
+            # 補查快照中其他行的 symbol，並取得所有價格；查價失敗時仍寫入爬取的資料
+            try:
+                price_updates, price_count = self._build_price_updates(snapshot.data_rows, start_row, header_row,
+                                                                       prefetcher=prefetcher)
+            except Exception as e:
+                print(f"查價失敗，只寫入爬取的資料: {e}")
+                price_updates, price_count = [], 0
+            snapshot.apply_updates(price_updates)
+        finally:
+            # 中途發生例外時也要結束背景查價執行緒，避免每次失敗的排程留下一個執行緒
+            if prefetcher is not None:
+                prefetcher.stop()
+        
+        # 合併兩組更新（價格覆蓋爬取時留空的價格欄位），再與原始資料比對
+        merged_cells = {}
+        for cell, value in scrape_cells + price_updates:
+            merged_cells[cell] = value
+        changed_cells = [cell for row in self._filter_unchanged_cells([list(merged_cells.items())], original_rows, start_row)
+                         for cell in row]
         
+        if changed_cells:
+            print(f"\n執行合併寫入: {len(changed_cells)} 個儲存格")
+            self._batch_update_cells(spreadsheet_id, [changed_cells])
+        
+        self._record_scraped_urls(snapshot.url_rows, start_row, only_rows)
+        
+        print(f"成功處理 {scraped_count} 行基本資料，填入 {price_count} 個價格")
+    
+    def _select_refresh_rows(self, snapshot: SheetSnapshot) -> Optional[Set[int]]:
+        """增量更新模式下挑出本次要爬取的行，未啟用時回傳 None（處理所有行）"""
+        if not getattr(config, 'INCREMENTAL_REFRESH', False):
+            return None
+        rows = plan_incremental_rows(
+            snapshot,
+            self.url_state,
+            config.COLUMN_MAPPINGS['last_updated'],
+            max_age_seconds=getattr(config, 'INCREMENTAL_MAX_AGE_MINUTES', 60) * 60,
+            budget=getattr(config, 'INCREMENTAL_ROW_BUDGET', 50),
+        )
+        return set(rows)
+    
+    def _record_scraped_urls(self, url_data: List[List], start_row: int, only_rows: Optional[Set[int]]):
+        """記錄本次爬取的網址，下次增量更新時用來判斷網址是否變更"""
+        scraped = {start_row + i: row[0] for i, row in enumerate(url_data)
+                   if row and row[0] and (only_rows is None or i in only_rows)}
+        self.url_state.update(scraped)
+        self.url_state.save()
+    
+    @staticmethod
+    def _to_price_symbol(symbol: str) -> str:
+        """去掉 s 前綴，取得用於價格查詢的 symbol"""
+        return symbol.replace('s', '') if symbol.startswith('s') else symbol
+    
+    def _validate_column_mappings(self, header_row: List) -> bool:
+        """依表頭驗證 COLUMN_MAPPINGS 的欄位位置是否正確"""
         # 使用 config.py 中的欄位映射，確保絕對安全
         safe_field_mapping = config.COLUMN_MAPPINGS
         
@@ -169,25 +479,30 @@ class SheetsProcessor:
         
         if not validation_passed:
             print("欄位驗證失敗，停止執行以避免覆蓋錯誤欄位")
-            return
-        
-        # 讀取完整的資料範圍
-        data_range = f"交易!A{start_row}:Z{end_row if end_row else ''}"
-        all_data = self.read_sheet_data(spreadsheet_id, data_range)
-        
-        # 讀取URL欄位的資料
-        url_range = f"交易!{url_column}{start_row}:{url_column}{end_row if end_row else ''}"
-        url_data = self.read_sheet_data(spreadsheet_id, url_range)
-        
-        # 確保我們處理所有行，包括空行
-        total_rows = end_row - start_row + 1 if end_row else len(all_data)
-        print(f"總共需要處理 {total_rows} 行")
+        return validation_passed
+    
+    def _build_scrape_updates(self, url_data: List[List], header_row: List, start_row: int,
+                              on_scraped: Optional[Callable[[Dict[str, str]], None]] = None,
+                              only_rows: Optional[Set[int]] = None) -> Tuple[List[List[tuple]], int]:
+        """爬取所有網址並整理成每行要更新的儲存格清單，回傳 (批次更新, 處理行數)
+
+        有傳入 only_rows 時（增量更新），只處理這些行（0-based，相對於 start_row）。
+        """
+        safe_field_mapping = config.COLUMN_MAPPINGS
         
         # 批次更新，減少 API 呼叫
         batch_updates = []
         updated_count = 0
         
+        # 先並行取得所有有網址的行的帳戶資料，結果依行號順序回填
+        scrape_targets = [(i, row[0]) for i, row in enumerate(url_data)
+                          if row and row[0] and (only_rows is None or i in only_rows)]
+        scraped_results = self.account_source.fetch_accounts([url for _, url in scrape_targets], on_result=on_scraped)
+        scraped_by_index = {i: result for (i, _), result in zip(scrape_targets, scraped_results)}
+        
         for i, row in enumerate(url_data):
+            if only_rows is not None and i not in only_rows:
+                continue
             if not row:
                 # 處理空行，至少填入 last_updated
                 print(f"\n處理第 {start_row + i} 行: 空行")
@@ -230,7 +545,7 @@ class SheetsProcessor:
                 continue
                 
             print(f"\n處理第 {start_row + i} 行: {url}")
-            scraped_info = self.scrape_block_explorer_data(url)
+            scraped_info = scraped_by_index.get(i, {})
             
             # 收集這一行要更新的所有欄位
             row_updates = []
@@ -238,7 +553,7 @@ class SheetsProcessor:
             for field, col_idx in safe_field_mapping.items():
                 value = scraped_info.get(field, '')
                 # 對金額欄位進行清理
-                if field in ['collateral_amount', 'balance', 'change', 'realized_pnl', 'unrealized_pnl']:
+                if field in ['collateral_amount', 'balance', 'realized_pnl', 'unrealized_pnl']:
                     value = self.clean_monetary_value(value)
                 if field == 'last_updated':
                     value = scraped_info.get('last_updated', '')
@@ -257,35 +572,91 @@ class SheetsProcessor:
                 print(f"  加入批次更新: {len(row_updates)} 個欄位")
             else:
                 print(f"  沒有需要更新的欄位")
-            
-            time.sleep(1)
         
-        # 執行批次更新
-        if batch_updates:
-            print(f"\n執行批次更新: {len(batch_updates)} 行，共 {sum(len(row) for row in batch_updates)} 個儲存格")
-            self._batch_update_cells(spreadsheet_id, batch_updates)
+        return batch_updates, updated_count
+    
+    def scrape_urls(self, urls: List[str], on_result: Optional[Callable[[Dict[str, str]], None]] = None) -> List[Dict[str, str]]:
+        """並行爬取多個網址，回傳結果順序與輸入網址順序相同
+
+        on_result 會在每個網址爬取完成時立即被呼叫（依完成順序），可用來提早開始查價。
+        """
+        if not urls:
+            return []
         
-        print(f"成功處理 {updated_count} 行 symbol/基本資料填寫")
+        workers = max(1, min(self.scrape_max_workers, len(urls)))
+        print(f"開始爬取 {len(urls)} 個網址（並行數: {workers}）")
+        start_time = time.monotonic()
+        
+        def scrape(url):
+            result = self.scrape_block_explorer_data(url)
+            if on_result:
+                try:
+                    on_result(result)
+                except Exception as e:
+                    print(f"處理爬取結果時發生錯誤: {e}")
+            return result
+        
+        if workers == 1:
+            results = [scrape(url) for url in urls]
+        else:
+            # executor.map 會依輸入順序回傳結果，方便後續依行號寫回
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(scrape, urls))
+        
+        print(f"爬取完成: {len(urls)} 個網址，耗時 {time.monotonic() - start_time:.1f} 秒")
+        print(f"連線統計: {self.http_session.format_stats()}，累計下載 {self.scrape_bytes / 1024:.0f} KB")
+        return results
+    
+    @staticmethod
+    def _skip_pending_price_cells(batch_updates: List[List[tuple]], all_data: List[List], start_row: int) -> List[List[tuple]]:
+        """移除 symbol 沒有變動的行的價格儲存格，這些價格留給查價步驟寫入"""
+        columns = config.COLUMN_MAPPINGS
+        price_symbol_columns = {columns[price]: columns[symbol]
+                                for price, symbol in (('price1', 'symbol1'), ('price', 'symbol'), ('price2', 'symbol2'))
+                                if price in columns and symbol in columns}
+        filtered = []
+        for row_updates in batch_updates:
+            kept = skip_pending_price_cells(row_updates, all_data, start_row, price_symbol_columns)
+            if kept:
+                filtered.append(kept)
+        return filtered
+    
+    def _filter_unchanged_cells(self, batch_updates: List[List[tuple]], all_data: List[List], start_row: int) -> List[List[tuple]]:
+        """比對記憶體中的試算表資料，移除值沒有變動的儲存格（ALWAYS_TOUCH_FIELDS 欄位一律寫入）"""
+        if not getattr(config, 'DIFF_WRITES', True):
+            return batch_updates
+        
+        always_touch_fields = getattr(config, 'ALWAYS_TOUCH_FIELDS', ['last_updated'])
+        always_touch_columns = [config.COLUMN_MAPPINGS[field] for field in always_touch_fields
+                                if field in config.COLUMN_MAPPINGS]
+        
+        filtered = []
+        total_count = 0
+        changed_count = 0
+        for row_updates in batch_updates:
+            total_count += len(row_updates)
+            changed = diff_cell_updates(row_updates, all_data, start_row, always_touch_columns)
+            changed_count += len(changed)
+            if changed:
+                filtered.append(changed)
+        
+        print(f"差異比對: {total_count} 個儲存格中有 {changed_count} 個需要寫入，略過 {total_count - changed_count} 個未變動")
+        return filtered
     
     def _batch_update_cells(self, spreadsheet_id: str, batch_updates: List[List[tuple]], max_retries: int = 3):
-        """批次更新多個 cell，減少 API 呼叫次數，加入重試機制"""
+        """批次更新多個 cell：相鄰儲存格合併成矩形範圍，並盡量塞進同一個請求，加入重試機制"""
         try:
-            # 將所有更新合併成一個批次請求
-            all_updates = []
-            for row_updates in batch_updates:
-                for cell, value in row_updates:
-                    # 添加分頁名稱
-                    cell_with_sheet = f"交易!{cell}"
-                    all_updates.append({
-                        'range': cell_with_sheet,
-                        'values': [[value]]
-                    })
+            # 將所有儲存格更新合併成連續的矩形範圍
+            all_cells = [update for row_updates in batch_updates for update in row_updates]
+            value_ranges = coalesce_cell_updates(all_cells)
             
-            # 分批執行，每批最多 10 個更新
-            batch_size = 10
-            for i in range(0, len(all_updates), batch_size):
-                batch = all_updates[i:i + batch_size]
-                
+            # 依請求大小上限打包，每個請求盡量包含最多的範圍
+            max_payload_bytes = getattr(config, 'SHEETS_MAX_PAYLOAD_BYTES', DEFAULT_MAX_PAYLOAD_BYTES)
+            request_batches = pack_value_ranges(value_ranges, max_payload_bytes)
+            batch_delay = getattr(config, 'BATCH_DELAY', 2)
+            print(f"合併寫入: {len(all_cells)} 個儲存格 -> {len(value_ranges)} 個範圍，共 {len(request_batches)} 個請求")
+            
+            for i, batch in enumerate(request_batches):
                 # 重試機制
                 retry_count = 0
                 while retry_count < max_retries:
@@ -325,14 +696,14 @@ class SheetsProcessor:
                             time.sleep(wait_time)
                         
                         if retry_count >= max_retries:
-                            print(f"批次更新失敗，已重試 {max_retries} 次，跳過此批次")
-                            # 嘗試單個更新作為最後手段
-                            self._fallback_single_updates(spreadsheet_id, batch)
+                            print(f"批次更新失敗，已重試 {max_retries} 次，改為逐一範圍更新")
+                            # 逐一範圍更新作為最後手段
+                            self._fallback_range_updates(spreadsheet_id, batch)
                             break
                 
-                # 批次間延遲，避免 429 錯誤
-                if i + batch_size < len(all_updates):
-                    time.sleep(2)
+                # 請求間延遲，避免 429 錯誤
+                if i + 1 < len(request_batches):
+                    time.sleep(batch_delay)
                     
         except Exception as e:
             print(f"批次更新時發生嚴重錯誤: {e}")
@@ -340,6 +711,27 @@ class SheetsProcessor:
             # 如果批次更新完全失敗，嘗試單個更新
             self._fallback_single_updates(spreadsheet_id, batch_updates)
 
+    def _fallback_range_updates(self, spreadsheet_id: str, value_ranges: List[Dict]):
+        """備用方案：逐一更新每個合併後的範圍"""
+        print("使用逐一範圍更新備用方案...")
+        success_count = 0
+        
+        for value_range in value_ranges:
+            try:
+                self.service.spreadsheets().values().update(
+                    spreadsheetId=spreadsheet_id,
+                    range=value_range['range'],
+                    valueInputOption='USER_ENTERED',
+                    body={'values': value_range['values']}
+                ).execute()
+                success_count += 1
+                time.sleep(0.5)  # 單個更新間隔
+            except Exception as e:
+                print(f"範圍更新失敗 {value_range['range']}: {e}")
+                continue
+        
+        print(f"備用更新完成: {success_count}/{len(value_ranges)} 個範圍成功更新")
+
     def _fallback_single_updates(self, spreadsheet_id: str, batch_updates: List[List[tuple]]):
         """備用方案：單個儲存格更新"""
         print("使用單個更新備用方案...")
@@ -359,15 +751,41 @@ class SheetsProcessor:
         
         print(f"備用更新完成: {success_count}/{total_count} 個儲存格成功更新")
 
-    def fill_prices_by_symbol(self, spreadsheet_id: str, start_row: int = 2, end_row: Optional[int] = None):
-        """第二步：根據 symbol 欄位批次查價，填入 Price 欄位（支援兩組倉位）"""
-        header_range = "交易!1:1"  # 讀取第二個分頁（交易分頁）的第1行作為標題行
-        headers = self.read_sheet_data(spreadsheet_id, header_range)
-        if not headers or not headers[0]:
+    def fill_prices_by_symbol(self, spreadsheet_id: str, start_row: int = 2, end_row: Optional[int] = None,
+                              snapshot: Optional[SheetSnapshot] = None, prefetcher: Optional[PricePrefetcher] = None):
+        """第二步：根據 symbol 欄位批次查價，填入 Price 欄位（支援兩組倉位）
+
+        有傳入步驟 1 使用的 prefetcher 時，只補查尚未送出的 symbol 並等待背景查價結果。
+        """
+        # 優先使用步驟 1 更新過的快照，沒有時才重新讀取
+        if snapshot is None:
+            snapshot = self.load_snapshot(spreadsheet_id, config.URL_COLUMN, start_row, end_row)
+        if snapshot is None or not snapshot.header_row:
             print("無法讀取表頭")
             return
-        header_row = headers[0]
+        header_row = snapshot.header_row
+        
+        if not self._validate_price_columns(header_row):
+            return
+        
+        all_data = snapshot.data_rows
+        
+        price_updates, updated_count = self._build_price_updates(all_data, start_row, header_row, prefetcher=prefetcher)
+        
+        # 與讀取到的資料比較，只寫入有變動的價格
+        changed_prices = [cell for row in self._filter_unchanged_cells([price_updates], all_data, start_row) for cell in row]
         
+        # 批次更新價格
+        if changed_prices:
+            print(f"\n執行價格批次更新: {len(changed_prices)} 個儲存格")
+            self._batch_update_cells(spreadsheet_id, [changed_prices])
+        snapshot.apply_updates(price_updates)
+        
+        print(f"成功填入 {updated_count} 行價格")
+        print(f"CoinGecko 連線統計: {self.price_fetcher.coingecko_fetcher.session.format_stats()}")
+
+    def _validate_price_columns(self, header_row: List) -> bool:
+        """驗證兩組倉位的 Symbol / Price 欄位位置與名稱"""
         # 使用 config.py 中的欄位位置
         symbol1_col = config.COLUMN_MAPPINGS['symbol']    # I欄
         price1_col = config.COLUMN_MAPPINGS['price']      # J欄
@@ -378,7 +796,7 @@ class SheetsProcessor:
         if (symbol1_col >= len(header_row) or price1_col >= len(header_row) or 
             symbol2_col >= len(header_row) or price2_col >= len(header_row)):
             print("欄位索引超出範圍，停止執行")
-            return
+            return False
         
         symbol1_header = header_row[symbol1_col]
         price1_header = header_row[price1_col]
@@ -396,22 +814,35 @@ class SheetsProcessor:
         # 驗證欄位名稱
         if 'symbol' not in symbol1_header.lower():
             print(f"⚠️  警告: {chr(65 + symbol1_col)} 欄位名稱 '{symbol1_header}' 可能不是 Symbol1")
-            return
+            return False
         
         if 'price' not in price1_header.lower():
             print(f"⚠️  警告: {chr(65 + price1_col)} 欄位名稱 '{price1_header}' 可能不是 Price1")
-            return
+            return False
         
         if 'symbol' not in symbol2_header.lower():
             print(f"⚠️  警告: {chr(65 + symbol2_col)} 欄位名稱 '{symbol2_header}' 可能不是 Symbol2")
-            return
+            return False
         
         if 'price' not in price2_header.lower():
             print(f"⚠️  警告: {chr(65 + price2_col)} 欄位名稱 '{price2_header}' 可能不是 Price2")
-            return
+            return False
         
-        data_range = f"交易!A{start_row}:Z{end_row if end_row else ''}"
-        all_data = self.read_sheet_data(spreadsheet_id, data_range)
+        return True
+
+    def _build_price_updates(self, all_data: List[List], start_row: int, header_row: List,
+                             prefetcher: Optional[PricePrefetcher] = None) -> Tuple[List[tuple], int]:
+        """收集資料中的所有 symbol，批次查價後整理成價格儲存格更新，回傳 (價格更新, 更新數)
+
+        有傳入 prefetcher 時，只補送尚未查詢的 symbol 並等待背景查價完成。
+        """
+        # 使用 config.py 中的欄位位置
+        symbol1_col = config.COLUMN_MAPPINGS['symbol']    # I欄
+        price1_col = config.COLUMN_MAPPINGS['price']      # J欄
+        symbol2_col = config.COLUMN_MAPPINGS['symbol2']   # P欄
+        price2_col = config.COLUMN_MAPPINGS['price2']     # Q欄
+        price1_header = header_row[price1_col]
+        price2_header = header_row[price2_col]
         
         # 收集所有 symbol（第一組和第二組）
         symbol_set = set()
@@ -447,14 +878,38 @@ class SheetsProcessor:
         for symbol, rows in symbol2_rows.items():
             print(f"  {symbol}: 第 {[start_row + r for r in rows]} 行")
         
+        # 即時價格模式：先從 WebSocket 價格表取得，只有表中沒有或已過期的幣種才查詢 API
+        streamed_prices = {}
+        if self.price_stream is not None:
+            streamed_prices = self.price_stream.table.snapshot(symbol_set,
+                                                               max_age=getattr(config, 'PRICE_STREAM_MAX_AGE', 120))
+            print(f"\n即時價格表命中: {len(streamed_prices)}/{len(symbol_set)} 個幣種")
+        missing_symbols = [symbol for symbol in symbol_set if symbol not in streamed_prices]
+        
         # 批次查價
-        print(f"\n開始批次查價...")
-        prices = self.price_fetcher.get_prices_for_symbols(list(symbol_set))
+        if prefetcher is not None:
+            print(f"\n等待背景查價完成...")
+            prefetcher.submit(missing_symbols)
+            prices = prefetcher.finish()
+        elif missing_symbols:
+            print(f"\n開始批次查價...")
+            prices = self.price_fetcher.get_prices_for_symbols(missing_symbols)
+        else:
+            prices = {}
+        prices.update(streamed_prices)
         
         print(f"查價結果:")
         for symbol, price in prices.items():
             print(f"  {symbol}: ${price}")
         
+        # 各價格來源的延遲與命中統計
+        if len(self.price_fetcher.price_resolver.providers) > 1:
+            print(self.price_fetcher.price_resolver.format_stats())
+        
+        # 列出一直查不到 ID 或價格的幣種
+        if self.price_fetcher.coingecko_fetcher.get_stuck_symbols_report():
+            print(self.price_fetcher.coingecko_fetcher.negative_cache.format_report())
+        
         # 批次寫入價格
         price_updates = []
         updated_count = 0
@@ -494,13 +949,68 @@ class SheetsProcessor:
                 else:
                     print(f"  跳過第二組價格更新: {clean_symbol} 沒有價格資料")
         
-        # 批次更新價格
-        if price_updates:
-            print(f"\n執行價格批次更新: {len(price_updates)} 個儲存格")
-            self._batch_update_cells(spreadsheet_id, [price_updates])
-        
-        print(f"成功填入 {updated_count} 行價格")
+        return price_updates, updated_count
+
+    def _add_scrape_bytes(self, count: int):
+        with self._scrape_bytes_lock:
+            self.scrape_bytes += count
+    
+    def _stream_account_page(self, url: str) -> Dict[str, str]:
+        """分段下載並解析帳戶頁面，取得所需欄位或超過 SCRAPE_MAX_BODY_BYTES 時停止解析
 
+        提前完成時，剩餘內容不超過 SCRAPE_DRAIN_BYTES 就讀完並丟棄，讓連線回到連線池重用；
+        剩餘內容較大時才關閉連線。
+        """
+        max_bytes = getattr(config, 'SCRAPE_MAX_BODY_BYTES', 5 * 1024 * 1024)
+        chunk_size = getattr(config, 'SCRAPE_CHUNK_SIZE', 16384)
+        drain_bytes = getattr(config, 'SCRAPE_DRAIN_BYTES', 256 * 1024)
+        parser = IncrementalAccountParser(parser=getattr(config, 'HTML_PARSER', 'lxml'))
+        received = 0
+        response = self.http_session.get(url, stream=True)
+        try:
+            response.raise_for_status()
+            try:
+                decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            except LookupError:
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            chunks = response.iter_content(chunk_size=chunk_size)
+            for chunk in chunks:
+                received += len(chunk)
+                if parser.feed(decoder.decode(chunk)):
+                    received += self._drain_response(response, chunks, drain_bytes)
+                    break
+                if max_bytes and received >= max_bytes:
+                    print(f"頁面超過大小上限 {max_bytes} 位元組，停止下載: {url}")
+                    break
+            else:
+                parser.feed(decoder.decode(b'', final=True))
+        finally:
+            # 已讀完的回應會把連線還給連線池；未讀完的回應關閉連線
+            response.close()
+            self._add_scrape_bytes(received)
+        return parser.result()
+    
+    @staticmethod
+    def _drain_response(response, chunks, limit: int) -> int:
+        """剩餘內容不超過 limit 時讀完（不解析），回傳讀取的位元組數"""
+        content_length = response.headers.get('Content-Length')
+        if content_length is not None:
+            try:
+                # raw.tell() 為已從連線讀取的位元組數（壓縮前），與 Content-Length 相同單位
+                remaining = int(content_length) - response.raw.tell()
+            except (AttributeError, TypeError, ValueError):
+                remaining = None
+            if remaining is not None and remaining > limit:
+                print(f"已取得所需欄位，剩餘 {remaining} 位元組不下載")
+                return 0
+        drained = 0
+        for chunk in chunks:
+            drained += len(chunk)
+            if drained > limit:
+                print(f"已取得所需欄位，剩餘內容超過 {limit} 位元組，停止下載")
+                return drained
+        return drained
+    
     def scrape_block_explorer_data(self, url: str, max_retries: int = 3) -> Dict[str, str]:
         """爬取區塊瀏覽器網址的實際資料，加入重試機制"""
         if not url or pd.isna(url):
@@ -512,174 +1022,19 @@ class SheetsProcessor:
             try:
                 print(f"正在爬取: {url} (嘗試 {retry_count + 1}/{max_retries})")
                 
-                # 設定請求標頭，模擬瀏覽器
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                
-                # 發送請求
-                response = requests.get(url, headers=headers, timeout=15)  # 增加超時時間
-                response.raise_for_status()
-                
-                # 解析HTML
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                result = {
-                    'address': '',
-                    'collateral_amount': '',
-                    'open_positions': '',
-                    'balance': '',
-                    'change': '',
-                    'last_activity': '',
-                    'last_updated': datetime.now().strftime('%Y/%m/%d %H:%M:%S'),
-                    # 第一組倉位
-                    'symbol1': '',
-                    'size1': '',
-                    'direction1': '',
-                    'realized_pnl1': '',
-                    'unrealized_pnl1': '',
-                    'price1': '',
-                    # 第二組倉位
-                    'symbol2': '',
-                    'size2': '',
-                    'direction2': '',
-                    'realized_pnl2': '',
-                    'unrealized_pnl2': '',
-                    'price2': '',
-                    # 保持向後相容的欄位
-                    'symbol': '',
-                    'size': '',
-                    'direction': '',
-                    'realized_pnl': '',
-                    'unrealized_pnl': '',
-                    'current_price': ''  # 保留原有價格欄位
-                }
-                
-                # 尋找地址（通常是以0x開頭的長字串）
-                addresses = soup.find_all(string=lambda text: text and len(text) > 20 and text.startswith('0x'))
-                if addresses:
-                    result['address'] = addresses[0].strip()
-                
-                # 尋找金額資料（包含$符號的數字）
-                money_patterns = soup.find_all(string=lambda text: text and '$' in text and any(char.isdigit() for char in text))
-                for pattern in money_patterns:
-                    text = pattern.strip()
-                    if '$' in text and any(char.isdigit() for char in text):
-                        # 第一個金額通常是餘額
-                        if not result['balance']:
-                            result['balance'] = self.clean_monetary_value(text)
-                        # 第二個金額通常是變化
-                        elif not result['change']:
-                            result['change'] = self.clean_monetary_value(text)
-                
-                # 尋找Collateral Amount - 使用更簡單的方法
-                # 從所有文字中尋找包含"Collateral Amount:"的行
-                all_text = soup.get_text()
-                lines = all_text.split('\n')
-                for line in lines:
-                    if 'Collateral Amount:' in line and '$' in line:
-                        # 提取金額
-                        dollar_index = line.find('$')
-                        if dollar_index != -1:
-                            # 找到$後的下一個空格或行尾
-                            end_index = line.find(' ', dollar_index)
-                            if end_index == -1:
-                                end_index = len(line)
-                            collateral_amount = line[dollar_index:end_index].strip()
-                            # 清理可能的額外文字
-                            if 'Open' in collateral_amount:
-                                collateral_amount = collateral_amount.replace('Open', '').strip()
-                            # 去掉 $ 符號（更強力的清理）
-                            collateral_amount = collateral_amount.replace('$', '').replace('＄', '').strip()
-                            # 確保沒有其他貨幣符號
-                            collateral_amount = re.sub(r'[^\d\-\.]', '', collateral_amount)
-                            result['collateral_amount'] = self.clean_monetary_value(collateral_amount)
-                            break
-                
-                # 尋找Open Positions - 支援兩組倉位
-                open_positions = []
-                position_count = 0
-                
-                # 由於頁面內容可能被壓縮在一行中，使用正則表達式來匹配倉位模式
-                all_text = soup.get_text()
-                
-                # 使用正則表達式來匹配倉位模式 - 支援多種格式
-                position_patterns = [
-                    # 原始格式：LDO Size: 62.0 Side: SHORT
-                    r'([A-Z]{2,10})Size:\s*([\d\.]+)\s*Side:\s*(SHORT|LONG)\s*Realized PnL:\s*([$\-\d,\.]+)\s*Unrealized PnL:\s*([$\-\d,\.]+)',
-                    # AI16Z格式：AI16ZSize: 3265.3 Side: SHORT
-                    r'([A-Z0-9]{2,10})Size:\s*([\d\.]+)\s*Side:\s*(SHORT|LONG)\s*Realized PnL:\s*([$\-\d,\.]+)\s*Unrealized PnL:\s*([$\-\d,\.]+)',
-                    # 簡化格式：Size: 3265.3 Side: SHORT
-                    r'Size:\s*([\d\.]+)\s*Side:\s*(SHORT|LONG)\s*Realized PnL:\s*([$\-\d,\.]+)\s*Unrealized PnL:\s*([$\-\d,\.]+)',
-                ]
-                
-                matches = []
-                for pattern in position_patterns:
-                    matches = re.findall(pattern, all_text)
-                    if matches:
-                        print(f"使用模式找到 {len(matches)} 個倉位匹配: {pattern}")
-                        break
-                
-                print(f"找到 {len(matches)} 個倉位匹配")
-                
-                for i, match in enumerate(matches[:2]):  # 只處理前兩個倉位
-                    position_count += 1
-                    
-                    # 處理不同格式的匹配結果
-                    if len(match) == 5:  # 完整格式：包含幣種代碼
-                        symbol, size, side, realized_pnl, unrealized_pnl = match
-                    elif len(match) == 4:  # 簡化格式：沒有幣種代碼
-                        size, side, realized_pnl, unrealized_pnl = match
-                        symbol = 'AI16Z'  # 預設幣種代碼
-                    else:
-                        continue
-                    
-                    # 清理PnL值
-                    realized_pnl_clean = self.clean_monetary_value(realized_pnl)
-                    unrealized_pnl_clean = self.clean_monetary_value(unrealized_pnl)
-                    
-                    # 去掉s前綴用於顯示
-                    clean_symbol = symbol.replace('s', '') if symbol.startswith('s') else symbol
-                    
-                    # 組合倉位資訊
-                    position_info = f"{clean_symbol} | Size: {size} | Side: {side}"
-                    if realized_pnl_clean:
-                        position_info += f" | Realized PnL: {realized_pnl_clean}"
-                    if unrealized_pnl_clean:
-                        position_info += f" | Unrealized PnL: {unrealized_pnl_clean}"
-                    
-                    open_positions.append(position_info)
+                # 發送請求（依主機限制並行數與請求間隔，標頭與逾時由共用 session 設定）
+                if getattr(config, 'SCRAPE_STREAMING', True):
+                    # 串流模式：邊下載邊解析，取得所需欄位後即停止下載
+                    with self.host_throttle.slot(url):
+                        result = self._stream_account_page(url)
+                else:
+                    with self.host_throttle.slot(url):
+                        response = self.http_session.get(url)
+                    response.raise_for_status()
+                    self._add_scrape_bytes(len(response.content))
                     
-                    # 設定對應組別的詳細資訊
-                    if position_count == 1:
-                        # 第一組倉位
-                        result['symbol1'] = clean_symbol
-                        result['size1'] = size
-                        result['direction1'] = side
-                        result['realized_pnl1'] = realized_pnl_clean
-                        result['unrealized_pnl1'] = unrealized_pnl_clean
-                        
-                        # 設定第一個倉位為主要倉位（保持向後相容）
-                        if not result['symbol']:
-                            result['symbol'] = clean_symbol
-                            result['size'] = size
-                            result['direction'] = side
-                            result['realized_pnl'] = realized_pnl_clean
-                            result['unrealized_pnl'] = unrealized_pnl_clean
-                            
-                    elif position_count == 2:
-                        # 第二組倉位
-                        result['symbol2'] = clean_symbol
-                        result['size2'] = size
-                        result['direction2'] = side
-                        result['realized_pnl2'] = realized_pnl_clean
-                        result['unrealized_pnl2'] = unrealized_pnl_clean
-                
-                # 組合倉位資訊 - 分別填入 Open Positions1 和 Open Positions2
-                if len(open_positions) >= 1:
-                    result['open_positions'] = open_positions[0]  # 第一組倉位
-                if len(open_positions) >= 2:
-                    result['open_positions2'] = open_positions[1]  # 第二組倉位
+                    # 解析HTML：頁面文字只擷取一次，所有欄位共用
+                    result = parse_account_page(response.text, parser=getattr(config, 'HTML_PARSER', 'lxml'))
                 
                 print(f"成功爬取資料: {url}")
                 return result
@@ -714,6 +1069,14 @@ if __name__ == "__main__":
     
     from config import SPREADSHEET_ID, URL_COLUMN, START_ROW, END_ROW
     
+    # 即時價格模式：背景訂閱 WebSocket，價格直接從記憶體中的價格表讀取
+    price_stream = None
+    if getattr(config, 'PRICE_STREAM', False):
+        price_stream = LighterPriceStream(
+            url=getattr(config, 'PRICE_STREAM_URL', 'wss://mainnet.zklighter.elliot.ai/stream'),
+            api_base_url=getattr(config, 'LIGHTER_API_BASE_URL', 'https://mainnet.zklighter.elliot.ai'),
+        ).start()
+    
     def run_main_process():
         """執行主要處理流程，加入完整的錯誤處理"""
         print(f"\n{'='*50}")
@@ -722,7 +1085,7 @@ if __name__ == "__main__":
         
         processor = None
         try:
-            processor = SheetsProcessor()
+            processor = SheetsProcessor(price_stream=price_stream)
             print("正在進行Google Sheets認證...")
             processor.authenticate()
             print("認證成功！")
@@ -731,38 +1094,98 @@ if __name__ == "__main__":
             print(f"認證失敗: {e}")
             print("請檢查 credentials.json 檔案和網路連線")
             print(f"{'='*50}\n")
+            if processor is not None:
+                processor.close()
             return
         
-        # 步驟1：填寫 symbol/基本資料
         try:
-            print("=== 步驟1：填寫 symbol/基本資料 ===")
-            processor.fill_symbols_from_urls(SPREADSHEET_ID, URL_COLUMN, START_ROW, END_ROW)
-            print("步驟1完成")
-        except Exception as e:
-            print(f"步驟1失敗: {e}")
-            print("繼續執行步驟2...")
+            run_pipeline(processor)
+        finally:
+            # 每次執行都會建立新的 processor，結束時關閉執行緒池與連線，避免閒置執行緒逐次累積
+            processor.close()
+    
+    def run_pipeline(processor):
+        """讀取快照後執行合併流程或步驟1、步驟2"""
+        # 一次讀取整份快照，步驟1與步驟2共用
+        print("正在讀取試算表快照...")
+        snapshot = processor.load_snapshot(SPREADSHEET_ID, URL_COLUMN, START_ROW, END_ROW)
+        
+        # 合併模式：爬取、查價後一次寫入
+        if getattr(config, 'FUSED_PIPELINE', False):
+            try:
+                print("=== 合併流程：爬取資料、查價並一次寫入 ===")
+                processor.run_fused_pipeline(SPREADSHEET_ID, URL_COLUMN, START_ROW, END_ROW, snapshot=snapshot)
+                print("合併流程完成")
+            except Exception as e:
+                print(f"合併流程失敗: {e}")
+            
+            print("全部完成！")
+            print(f"執行完成 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"{'='*50}\n")
+            return
         
-        # 步驟2：根據 symbol 批次查價並填入 Price
+        # 背景查價：步驟1一邊爬取一邊查價，步驟2只需等待結果
+        prefetcher = processor.start_price_prefetcher()
         try:
-            print("=== 步驟2：根據 symbol 批次查價並填入 Price ===")
-            processor.fill_prices_by_symbol(SPREADSHEET_ID, START_ROW, END_ROW)
-            print("步驟2完成")
-        except Exception as e:
-            print(f"步驟2失敗: {e}")
-            print("價格更新跳過，其他資料已更新")
+            # 步驟1：填寫 symbol/基本資料
+            try:
+                print("=== 步驟1：填寫 symbol/基本資料 ===")
+                processor.fill_symbols_from_urls(SPREADSHEET_ID, URL_COLUMN, START_ROW, END_ROW, snapshot=snapshot,
+                                                 prefetcher=prefetcher)
+                print("步驟1完成")
+            except Exception as e:
+                print(f"步驟1失敗: {e}")
+                print("繼續執行步驟2...")
+            
+            # 步驟2：根據 symbol 批次查價並填入 Price
+            try:
+                print("=== 步驟2：根據 symbol 批次查價並填入 Price ===")
+                processor.fill_prices_by_symbol(SPREADSHEET_ID, START_ROW, END_ROW, snapshot=snapshot,
+                                                prefetcher=prefetcher)
+                print("步驟2完成")
+            except Exception as e:
+                print(f"步驟2失敗: {e}")
+                print("價格更新跳過，其他資料已更新")
+        finally:
+            if prefetcher is not None:
+                prefetcher.stop()
         
         print("全部完成！")
         print(f"執行完成 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*50}\n")
     
-    # 設定排程：每個整點執行
-    schedule.every().hour.at(":00").do(run_main_process)
+    # 即時價格更新每分鐘執行，共用同一個已認證的 processor（快取、索引與連線池只載入一次）
+    price_refresh_processor = None
+    
+    def run_price_refresh():
+        """即時價格模式：只從價格表更新 Price 欄位，不爬取網頁"""
+        global price_refresh_processor
+        try:
+            if price_refresh_processor is None:
+                processor = SheetsProcessor(price_stream=price_stream)
+                processor.authenticate()
+                price_refresh_processor = processor
+            snapshot = price_refresh_processor.load_snapshot(SPREADSHEET_ID, URL_COLUMN, START_ROW, END_ROW)
+            price_refresh_processor.fill_prices_by_symbol(SPREADSHEET_ID, START_ROW, END_ROW, snapshot=snapshot)
+        except Exception as e:
+            print(f"即時價格更新失敗: {e}")
+    
+    # 設定排程：每個整點執行；增量更新模式改為每隔幾分鐘處理一小批
+    if getattr(config, 'INCREMENTAL_REFRESH', False):
+        schedule.every(getattr(config, 'INCREMENTAL_INTERVAL_MINUTES', 10)).minutes.do(run_main_process)
+    else:
+        schedule.every().hour.at(":00").do(run_main_process)
+    if price_stream is not None:
+        schedule.every(getattr(config, 'PRICE_STREAM_REFRESH_MINUTES', 1)).minutes.do(run_price_refresh)
     
     print("=" * 60)
     print("    Google Sheets 自動處理程式")
     print("=" * 60)
     print(f"啟動時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("排程設定: 每個整點自動執行")
+    if getattr(config, 'INCREMENTAL_REFRESH', False):
+        print(f"排程設定: 增量更新，每 {getattr(config, 'INCREMENTAL_INTERVAL_MINUTES', 10)} 分鐘執行")
+    else:
+        print("排程設定: 每個整點自動執行")
     print("按 Ctrl+C 停止程式")
     print("=" * 60)
     
@@ -780,4 +1203,6 @@ if __name__ == "__main__":
             time.sleep(60)  # 每分鐘檢查一次
             
     except KeyboardInterrupt:
+        if price_stream is not None:
+            price_stream.stop()
         print("\n程式已停止") 
\ No newline at end of file
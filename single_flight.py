@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """合併同時進行的相同請求：同一個鍵同時只會執行一次，其他呼叫者等待並共用結果
+
+    可同時由多個執行緒與 asyncio 協程使用；結果不會被保留，呼叫完成後下一次仍會重新執行。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0  # 實際執行次數
+        self.shared = 0    # 共用其他呼叫結果的次數
+
+    def _join_or_lead(self, key: Hashable):
+        """回傳 (future, 是否由自己執行)"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.executed += 1
+            return future, True
+
+    def _run_leader(self, key: Hashable, future: Future, func: Callable):
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def do(self, key: Hashable, func: Callable):
+        """執行 func()；若相同的鍵正在執行中，等待並回傳那次的結果"""
+        future, is_leader = self._join_or_lead(key)
+        if not is_leader:
+            return future.result()
+        return self._run_leader(key, future, func)
+
+    async def do_async(self, key: Hashable, func: Callable):
+        """do 的 asyncio 版本：func 為同步函式，在執行緒池中執行，不會阻塞事件迴圈"""
+        future, is_leader = self._join_or_lead(key)
+        if not is_leader:
+            return await asyncio.wrap_future(future)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._run_leader, key, future, func)
+
+    def get_stats(self) -> Dict[str, int]:
+        """取得執行與共用次數"""
+        with self._lock:
+            return {'executed': self.executed, 'shared': self.shared}
@@ -0,0 +1,97 @@
+"""帳戶頁面解析測試：串流解析與整頁解析、內嵌 JSON 與頁面文字必須得到相同的結果
+
+執行方式：python -m unittest discover tests
+"""
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from account_parser import IncrementalAccountParser, lxml, parse_account_page  # noqa: E402
+from benchmarks.sample_pages import make_account_page  # noqa: E402
+
+PARSERS = ['text'] + (['lxml'] if lxml is not None else [])
+
+
+def without_timestamp(result):
+    return {key: value for key, value in result.items() if key != 'last_updated'}
+
+
+def parse_full(html, parser='text'):
+    with redirect_stdout(io.StringIO()):
+        return without_timestamp(parse_account_page(html, parser))
+
+
+def parse_streamed(html, parser, chunk_size=4096):
+    """分段送入解析器，回傳 (結果, 讀取的字元數)"""
+    incremental = IncrementalAccountParser(parser=parser)
+    consumed = len(html)
+    with redirect_stdout(io.StringIO()):
+        for start in range(0, len(html), chunk_size):
+            if incremental.feed(html[start:start + chunk_size]):
+                consumed = min(len(html), start + chunk_size)
+                break
+        return without_timestamp(incremental.result()), consumed
+
+
+def page_with_gap_before_positions(gap_chars=20000):
+    """抵押區塊與倉位之間有一大段其他內容的頁面"""
+    filler = ''.join(f'<p>Activity note {i} lorem ipsum dolor sit amet</p>' for i in range(gap_chars // 30))
+    return (
+        '<html><body><main><h1>Account 53015</h1>'
+        '<div class="address">0x5eb561a4216363698b529b4a97b750923ceb3ffd</div>'
+        '<div class="balance">$91,602.89</div><div class="change">$12.50</div>'
+        f'<div class="stats">Collateral Amount: $47,457.95 Open Positions: 2</div>'
+        f'<section class="activity">{filler}</section>'
+        '<section class="positions">'
+        '<div><span>ETH</span><span>Size: 2.5</span> <span>Side: LONG</span> '
+        '<span>Realized PnL: $10.00</span> <span>Unrealized PnL: $-5.25</span></div>'
+        '<div><span>BTC</span><span>Size: 0.1</span> <span>Side: SHORT</span> '
+        '<span>Realized PnL: $1.00</span> <span>Unrealized PnL: $2.00</span></div>'
+        '</section><table>' + '<tr><td>trade</td></tr>' * 500 + '</table></main></body></html>'
+    )
+
+
+class IncrementalAccountParserTest(unittest.TestCase):
+    def test_streamed_matches_full_parse_on_sample_pages(self):
+        for parser in PARSERS:
+            for positions in (0, 1, 2, 3):
+                for embedded in (False, True):
+                    html = make_account_page(positions=positions, trades=2000, seed=positions, embedded=embedded)
+                    with self.subTest(parser=parser, positions=positions, embedded=embedded):
+                        streamed, consumed = parse_streamed(html, parser)
+                        self.assertEqual(streamed, parse_full(html))
+                        self.assertLess(consumed, len(html))
+
+    def test_large_gap_before_positions_does_not_stop_early(self):
+        html = page_with_gap_before_positions()
+        full = parse_full(html)
+        self.assertEqual((full['symbol1'], full['symbol2']), ('ETH', 'BTC'))
+        for parser in PARSERS:
+            with self.subTest(parser=parser):
+                streamed, _ = parse_streamed(html, parser)
+                self.assertEqual(streamed, full)
+
+    def test_gap_rule_still_stops_pages_without_position_count(self):
+        html = make_account_page(positions=1, trades=2000).replace('Open Positions: 1', '')
+        for parser in PARSERS:
+            with self.subTest(parser=parser):
+                streamed, consumed = parse_streamed(html, parser)
+                self.assertEqual(streamed, parse_full(html))
+                self.assertLess(consumed, len(html) // 4)
+
+
+class EmbeddedStateTest(unittest.TestCase):
+    def test_embedded_json_and_page_text_give_same_result(self):
+        for positions in (0, 1, 2, 3):
+            text_only = make_account_page(positions=positions, seed=positions)
+            with_state = make_account_page(positions=positions, seed=positions, embedded=True)
+            with self.subTest(positions=positions):
+                self.assertEqual(parse_full(with_state), parse_full(text_only))
+
+
+if __name__ == '__main__':
+    unittest.main()
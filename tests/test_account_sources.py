@@ -0,0 +1,116 @@
+"""LighterApiSource 測試：以假的 HTTP session 模擬帳戶 API
+
+執行方式：python -m unittest discover tests
+"""
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from account_sources import AccountDataSource, LighterApiSource  # noqa: E402
+
+
+class StubResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._data
+
+
+class StubSession:
+    """依 value 回傳帳戶列表；blocked 中的 value 會等到事件觸發才回應"""
+
+    def __init__(self, accounts_by_value, blocked=None):
+        self.accounts_by_value = accounts_by_value
+        self.blocked = blocked or {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, **kwargs):
+        with self._lock:
+            self.requests.append(dict(params))
+        event = self.blocked.get(params['value'])
+        if event is not None:
+            event.wait(5)
+        accounts = self.accounts_by_value.get(params['value'])
+        if accounts is None:
+            return StubResponse(404, {})
+        return StubResponse(200, {'accounts': accounts})
+
+    def format_stats(self):
+        return 'stub'
+
+
+def account(index, symbol='ETH', collateral='100.5'):
+    return {
+        'index': index,
+        'l1_address': '0xabc',
+        'collateral': collateral,
+        'positions': [{'symbol': symbol, 'sign': -1, 'position': '1.5', 'realized_pnl': '2', 'unrealized_pnl': '-1'}],
+    }
+
+
+class LighterApiSourceTest(unittest.TestCase):
+    def test_results_follow_url_order_and_share_requests(self):
+        session = StubSession({'1': [account(1, 'ETH')], '2': [account(2, 'BTC')]})
+        source = LighterApiSource(session=session, retry_delay=0)
+        urls = ['https://scan.lighter.xyz/account/2', 'https://scan.lighter.xyz/account/1',
+                'https://scan.lighter.xyz/account/2', 'not a url']
+
+        results = source.fetch_accounts(urls)
+
+        self.assertEqual([r.get('symbol1') for r in results], ['BTC', 'ETH', 'BTC', None])
+        self.assertEqual(results[0]['direction1'], 'SHORT')
+        self.assertEqual(results[0]['collateral_amount'], '100.5')
+        self.assertEqual(len(session.requests), 2)
+
+    def test_missing_index_is_not_replaced_by_another_sub_account(self):
+        session = StubSession({'7': [account(8)]})
+        source = LighterApiSource(session=session, retry_delay=0)
+
+        self.assertEqual(source.fetch_accounts(['https://scan.lighter.xyz/account/7']), [{}])
+
+    def test_address_lookup_uses_one_request(self):
+        address = '0x' + 'a' * 40
+        session = StubSession({address: [account(3), account(4)]})
+        source = LighterApiSource(session=session, retry_delay=0)
+
+        results = source.fetch_accounts([f'https://scan.lighter.xyz/address/{address}'])
+
+        self.assertEqual(session.requests, [{'by': 'l1_address', 'value': address}])
+        self.assertEqual(results[0]['symbol1'], 'ETH')
+
+    def test_on_result_called_before_slow_requests_finish(self):
+        release = threading.Event()
+        session = StubSession({'1': [account(1)], '2': [account(2)]}, blocked={'2': release})
+        source = LighterApiSource(session=session, max_workers=2, retry_delay=0)
+        early = []
+
+        def on_result(result):
+            # 第一個結果送達時，較慢的請求仍未完成
+            early.append(release.is_set())
+            release.set()
+
+        source.fetch_accounts(['https://scan.lighter.xyz/account/1', 'https://scan.lighter.xyz/account/2'], on_result)
+
+        self.assertEqual(early[0], False)
+        self.assertEqual(len(early), 2)
+
+    def test_source_must_implement_fetch_accounts(self):
+        class Incomplete(AccountDataSource):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""CoinListIndex 測試：以假的 HTTP 函式模擬 CoinGecko 幣種清單
+
+執行方式：python -m unittest discover tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coin_index import CoinListIndex  # noqa: E402
+
+COINS = [
+    {'id': 'ethereum', 'symbol': 'eth', 'name': 'Ethereum'},
+    {'id': 'bridged-ether', 'symbol': 'eth', 'name': 'Bridged Ether'},
+    {'id': 'bitcoin', 'symbol': 'btc', 'name': 'Bitcoin'},
+]
+MARKETS = [{'id': 'bitcoin', 'market_cap_rank': 1}, {'id': 'ethereum', 'market_cap_rank': 2}]
+
+
+class StubResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class SlowCoinGecko:
+    """幣種清單延遲回應，記錄每個請求的路徑"""
+
+    def __init__(self, delay=0.3):
+        self.delay = delay
+        self.paths = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        with self._lock:
+            self.paths.append(url.rsplit('/', 2)[-2] + '/' + url.rsplit('/', 1)[-1])
+        if url.endswith('/coins/list'):
+            time.sleep(self.delay)
+            return StubResponse(COINS)
+        return StubResponse(MARKETS if params.get('page') == 1 else [])
+
+
+class CoinListIndexTest(unittest.TestCase):
+    def test_concurrent_cold_start_lookups_wait_for_refresh(self):
+        index = CoinListIndex(path=None, rank_pages=1)
+        coingecko = SlowCoinGecko()
+
+        def lookup(symbol):
+            index.ensure_fresh(coingecko.get, 'https://api.example')
+            return index.resolve(symbol)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lookup, ['ETH', 'BTC'] * 4))
+
+        self.assertEqual(results, ['ethereum', 'bitcoin'] * 4)
+        self.assertEqual(coingecko.paths.count('coins/list'), 1)
+
+    def test_failed_refresh_does_not_block_other_lookups(self):
+        index = CoinListIndex(path=None, rank_pages=1)
+
+        def failing_get(url, params=None, timeout=None):
+            raise RuntimeError('offline')
+
+        index.ensure_fresh(failing_get, 'https://api.example')
+        index.ensure_fresh(failing_get, 'https://api.example')
+
+        self.assertIsNone(index.resolve('ETH'))
+
+
+if __name__ == '__main__':
+    unittest.main()
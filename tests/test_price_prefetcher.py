@@ -0,0 +1,41 @@
+"""PricePrefetcher 測試：背景查價失敗的重試與執行緒結束
+
+執行方式：python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_prefetcher import PricePrefetcher  # noqa: E402
+
+
+class PricePrefetcherTest(unittest.TestCase):
+    def test_failed_background_batch_is_retried_in_finish(self):
+        calls = []
+
+        def fetch_batch(symbols):
+            calls.append(list(symbols))
+            if len(calls) == 1:
+                raise RuntimeError('timeout')
+            return {symbol: 1.0 for symbol in symbols}
+
+        prefetcher = PricePrefetcher(fetch_batch, batch_size=2, linger=0.01).start()
+        prefetcher.submit(['ETH', 'BTC'])
+
+        self.assertEqual(prefetcher.finish(timeout=5), {'ETH': 1.0, 'BTC': 1.0})
+        self.assertEqual(calls, [['ETH', 'BTC'], ['ETH', 'BTC']])
+
+    def test_stop_ends_thread_without_finish(self):
+        prefetcher = PricePrefetcher(lambda symbols: {}, linger=10).start()
+        prefetcher.submit(['ETH'])
+        prefetcher.stop()
+        prefetcher.stop()
+        prefetcher._thread.join(5)
+
+        self.assertFalse(prefetcher._thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+"""HedgedPriceResolver 測試：以假的價格來源模擬過慢、失敗與缺少幣種的情況
+
+LighterPriceProvider 以本機 http.server 提供 orderBookDetails 回應進行測試。
+
+執行方式：python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_providers import HedgedPriceResolver, LighterPriceProvider, PriceProvider, ProviderStats  # noqa: E402
+
+
+class StubProvider(PriceProvider):
+    """固定延遲後回傳指定價格，error 不為 None 時拋出例外"""
+
+    def __init__(self, name, prices, delay=0.0, error=None):
+        self.name = name
+        self.prices = prices
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.released = threading.Event()
+
+    def get_prices(self, symbols):
+        self.calls.append(list(symbols))
+        if self.delay:
+            self.released.wait(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+
+class OrderBookHandler(BaseHTTPRequestHandler):
+    """回傳 server.payload；server.delay 秒後回應，server.status 不是 200 時回傳錯誤"""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+        if server.delay:
+            time.sleep(server.delay)
+        body = json.dumps(server.payload if server.status == 200 else {'message': 'error'}).encode()
+        self.send_response(server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalOrderBookServer:
+    def __init__(self, payload, delay=0.0, status=200):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), OrderBookHandler)
+        self.server.daemon_threads = True
+        self.server.payload = payload
+        self.server.delay = delay
+        self.server.status = status
+        self.server.requests = []
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class UrllibResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return json.loads(self._body)
+
+
+class UrllibSession:
+    """只提供 get 的最小 HTTP session，讓測試不依賴 requests"""
+
+    def get(self, url, timeout=5, **kwargs):
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                return UrllibResponse(response.status, response.read())
+        except urllib.error.HTTPError as e:
+            return UrllibResponse(e.code, e.read())
+
+
+def order_book(*markets):
+    return {'code': 200, 'order_book_details': [{'symbol': symbol, 'last_trade_price': price} for symbol, price in markets]}
+
+
+def make_resolver(providers, **kwargs):
+    kwargs.setdefault('default_hedge_delay', 0.05)
+    kwargs.setdefault('min_hedge_delay', 0.01)
+    kwargs.setdefault('timeout', 5)
+    return HedgedPriceResolver(providers, stats={}, **kwargs)
+
+
+class HedgedPriceResolverTest(unittest.TestCase):
+    def test_fast_primary_does_not_hedge(self):
+        primary = StubProvider('primary', {'ETH': 3000.0, 'BTC': 60000.0})
+        backup = StubProvider('backup', {'ETH': 1.0, 'BTC': 1.0})
+        resolver = make_resolver([primary, backup])
+
+        prices = resolver.get_prices(['eth', 'BTC'])
+
+        self.assertEqual(prices, {'ETH': 3000.0, 'BTC': 60000.0})
+        self.assertEqual(backup.calls, [])
+        self.assertEqual(resolver.stats['primary'].wins, 1)
+        resolver.close()
+
+    def test_slow_primary_is_hedged_and_backup_wins(self):
+        primary = StubProvider('primary', {'ETH': 3000.0}, delay=2.0)
+        backup = StubProvider('backup', {'ETH': 2999.0})
+        resolver = make_resolver([primary, backup])
+
+        started = time.monotonic()
+        prices = resolver.get_prices(['ETH'])
+        elapsed = time.monotonic() - started
+        primary.released.set()
+
+        self.assertEqual(prices, {'ETH': 2999.0})
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(resolver.stats['primary'].hedged, 1)
+        self.assertEqual(resolver.stats['backup'].wins, 1)
+        resolver.close()
+
+    def test_failing_primary_falls_through_to_backup(self):
+        primary = StubProvider('primary', {}, error=RuntimeError('down'))
+        backup = StubProvider('backup', {'ETH': 2999.0})
+        resolver = make_resolver([primary, backup])
+
+        self.assertEqual(resolver.get_prices(['ETH']), {'ETH': 2999.0})
+        self.assertEqual(resolver.stats['primary'].errors, 1)
+        resolver.close()
+
+    def test_backup_only_asked_for_missing_symbols(self):
+        primary = StubProvider('primary', {'ETH': 3000.0})
+        backup = StubProvider('backup', {'ETH': 1.0, 'LDO': 1.5})
+        resolver = make_resolver([primary, backup])
+
+        self.assertEqual(resolver.get_prices(['ETH', 'LDO']), {'ETH': 3000.0, 'LDO': 1.5})
+        self.assertEqual(backup.calls, [['LDO']])
+        resolver.close()
+
+    def test_hedge_delay_uses_samples_before_min_samples(self):
+        primary = StubProvider('primary', {})
+        stats = {'primary': ProviderStats()}
+        resolver = HedgedPriceResolver([primary], default_hedge_delay=2.0, min_hedge_delay=0.01, stats=stats)
+        self.assertEqual(resolver.hedge_delay(primary), 2.0)
+
+        stats['primary'].record(0.3, 1, 1)
+        self.assertAlmostEqual(resolver.hedge_delay(primary), 0.3)
+        resolver.close()
+
+    def test_stats_shared_across_resolvers_by_default(self):
+        first = HedgedPriceResolver([StubProvider('shared-test', {'ETH': 1.0})])
+        first.get_prices(['ETH'])
+        second = HedgedPriceResolver([StubProvider('shared-test', {'ETH': 1.0})])
+        self.assertIs(first.stats['shared-test'], second.stats['shared-test'])
+        self.assertEqual(second.stats['shared-test'].calls, 1)
+        first.close()
+        second.close()
+
+    def test_provider_must_implement_get_prices(self):
+        class Incomplete(PriceProvider):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class LighterPriceProviderTest(unittest.TestCase):
+    def start_server(self, payload, **kwargs):
+        server = LocalOrderBookServer(payload, **kwargs)
+        self.addCleanup(server.close)
+        return server
+
+    def make_provider(self, server, **kwargs):
+        return LighterPriceProvider(base_url=server.base_url, session=UrllibSession(), **kwargs)
+
+    def test_parses_order_book_details_and_caches_table(self):
+        server = self.start_server(order_book(('ETH', '3000.5'), ('btc', 60000), ('BAD', 'n/a'), ('ZERO', '0')))
+        provider = self.make_provider(server)
+
+        self.assertEqual(provider.get_prices(['ETH', 'BTC', 'BAD', 'ZERO', 'LDO']), {'ETH': 3000.5, 'BTC': 60000.0})
+        self.assertEqual(provider.get_prices(['ETH']), {'ETH': 3000.5})
+        self.assertEqual(server.requests, ['/api/v1/orderBookDetails'])
+
+    def test_slow_lighter_is_hedged_by_fast_lighter(self):
+        slow = self.start_server(order_book(('ETH', '3000')), delay=1.0)
+        fast = self.start_server(order_book(('ETH', '2999')))
+        primary = self.make_provider(slow)
+        backup = self.make_provider(fast)
+        backup.name = 'lighter-backup'
+        resolver = make_resolver([primary, backup])
+
+        started = time.monotonic()
+        prices = resolver.get_prices(['ETH'])
+        elapsed = time.monotonic() - started
+        resolver.close()
+
+        self.assertEqual(prices, {'ETH': 2999.0})
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual(resolver.stats['lighter'].hedged, 1)
+        self.assertEqual(resolver.stats['lighter-backup'].wins, 1)
+
+    def test_failing_lighter_falls_through_to_backup(self):
+        server = self.start_server({}, status=503)
+        backup = StubProvider('backup', {'ETH': 2999.0})
+        resolver = make_resolver([self.make_provider(server), backup])
+
+        self.assertEqual(resolver.get_prices(['ETH']), {'ETH': 2999.0})
+        self.assertEqual(resolver.stats['lighter'].errors, 1)
+        self.assertEqual(server.requests, ['/api/v1/orderBookDetails'])
+        resolver.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
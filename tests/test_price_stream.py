@@ -0,0 +1,107 @@
+"""即時價格測試：以假的 WebSocket 訊息驅動 LighterPriceStream 與 StreamingPriceTable
+
+執行方式：python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_stream import LighterPriceStream, StreamingPriceTable  # noqa: E402
+
+
+class StubWebSocket:
+    """依序回傳預先準備的訊息，訊息用完時回傳空字串（視為斷線）"""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+        self.closed = False
+
+    def send(self, text):
+        self.sent.append(json.loads(text))
+
+    def recv(self):
+        return self.messages.pop(0) if self.messages else ''
+
+    def close(self):
+        self.closed = True
+
+
+def stats_message(*entries):
+    return json.dumps({'type': 'update/market_stats', 'market_stats': {str(e['market_id']): e for e in entries}})
+
+
+class StreamingPriceTableTest(unittest.TestCase):
+    def test_snapshot_skips_stale_prices(self):
+        table = StreamingPriceTable()
+        table.update({'eth': 3000.0}, timestamp=time.time())
+        table.update({'BTC': 60000.0}, timestamp=time.time() - 300)
+
+        self.assertEqual(table.snapshot(['ETH', 'BTC', 'LDO'], max_age=60), {'ETH': 3000.0})
+        self.assertEqual(table.get('btc'), 60000.0)
+        self.assertIsNone(table.get('btc', max_age=60))
+
+    def test_readers_keep_their_reference_during_updates(self):
+        table = StreamingPriceTable()
+        table.update({'ETH': 1.0})
+        before = table._prices
+        table.update({'ETH': 2.0})
+
+        self.assertEqual(before['ETH'][0], 1.0)
+        self.assertEqual(table.get('ETH'), 2.0)
+
+
+class LighterPriceStreamTest(unittest.TestCase):
+    def make_stream(self):
+        stream = LighterPriceStream(url='ws://localhost/stream', session=object(), max_reconnect_delay=0.01)
+        stream.market_symbols = {'0': 'ETH', '1': 'BTC'}
+        return stream
+
+    def test_handle_message_updates_table(self):
+        stream = self.make_stream()
+        stream.handle_message(stats_message({'market_id': 0, 'mark_price': '3001.5'},
+                                            {'market_id': 1, 'symbol': 'btc', 'last_trade_price': 60000},
+                                            {'market_id': 2, 'mark_price': 'bad'}))
+
+        self.assertEqual(stream.table.snapshot(['ETH', 'BTC']), {'ETH': 3001.5, 'BTC': 60000.0})
+        self.assertIsNone(stream.handle_message('not json'))
+
+    def test_run_subscribes_answers_ping_and_reconnects(self):
+        stream = self.make_stream()
+        connections = []
+        reconnected = threading.Event()
+
+        def create_connection(url, timeout=None):
+            if len(connections) == 0:
+                ws = StubWebSocket([json.dumps({'type': 'ping'}),
+                                    stats_message({'market_id': 0, 'mark_price': 3000})])
+            else:
+                ws = StubWebSocket([stats_message({'market_id': 0, 'mark_price': 3100})])
+                reconnected.set()
+            connections.append(ws)
+            return ws
+
+        websocket = types.SimpleNamespace(create_connection=create_connection)
+        with mock.patch.dict(sys.modules, {'websocket': websocket}):
+            stream.start()
+            self.assertTrue(reconnected.wait(5))
+            deadline = time.time() + 5
+            while stream.table.get('ETH') != 3100.0 and time.time() < deadline:
+                time.sleep(0.01)
+            stream.stop()
+
+        self.assertEqual(stream.table.get('ETH'), 3100.0)
+        self.assertEqual(connections[0].sent[0], {'type': 'subscribe', 'channel': 'market_stats/all'})
+        self.assertIn({'type': 'pong'}, connections[0].sent)
+        self.assertTrue(connections[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
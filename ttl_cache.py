@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+_KEY_SEPARATOR = '|'
+
+
+class TTLCache:
+    """有存活時間與容量上限的快取，超過容量時淘汰最久未使用的項目，可選擇保存到磁碟
+
+    鍵為字串或字串 tuple（例如 (coin_id, currency)），值需可轉為 JSON。
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 1000, path: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (過期時間, 值)
+        self._lock = threading.Lock()
+        # 保存到磁碟時序列化寫入，_lock 只在複製資料時持有，寫檔期間不阻塞查詢
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        if path:
+            self.load()
+
+    def get(self, key: Hashable):
+        """取得未過期的值，沒有或已過期時回傳 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self._dirty = True
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value, ttl_seconds: Optional[float] = None):
+        """寫入值，超過容量時淘汰最久未使用的項目"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def delete(self, key: Hashable):
+        """移除指定的項目"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._dirty = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self) -> Tuple[int, int]:
+        """回傳 (命中次數, 未命中次數)"""
+        return self.hits, self.misses
+
+    @staticmethod
+    def _encode_key(key) -> str:
+        if isinstance(key, tuple):
+            return _KEY_SEPARATOR.join(key)
+        return key
+
+    @staticmethod
+    def _decode_key(text: str):
+        return tuple(text.split(_KEY_SEPARATOR)) if _KEY_SEPARATOR in text else text
+
+    def save(self):
+        """將未過期的項目保存到磁碟（有變動時才寫入）"""
+        if not self.path or not self._dirty:
+            return
+        # 同時保存時共用同一個暫存檔，必須整段序列化，也避免較舊的內容覆蓋較新的檔案
+        with self._save_lock:
+            now = time.time()
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {
+                    self._encode_key(key): [expires_at, value]
+                    for key, (expires_at, value) in self._entries.items()
+                    if expires_at >= now
+                }
+                self._dirty = False
+            try:
+                # 先寫入暫存檔再取代，避免寫到一半中斷造成檔案損毀
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                self._dirty = True
+                print(f"儲存快取 {self.path} 時發生錯誤: {e}")
+
+    def load(self):
+        """從磁碟載入未過期的項目"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"載入快取 {self.path} 時發生錯誤: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for text, (expires_at, value) in sorted(data.items(), key=lambda item: item[1][0]):
+                if expires_at >= now:
+                    self._entries[self._decode_key(text)] = (expires_at, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)